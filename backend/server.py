@@ -1,27 +1,66 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, Cookie
-from fastapi.responses import JSONResponse
+import time
+# Startup profile reference point: everything after this counts toward cold start
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, Cookie, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import socket
+import re
+import asyncio
 import logging
 import json
+import base64
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import List, Optional, Union
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import uuid
+import heapq
+import itertools
+from email.utils import parsedate_to_datetime
 from datetime import datetime, timezone, timedelta
 import httpx
+import orjson
+# JWT/crypto packages (jwt, jose, cryptography) are imported where they're used
+# and warmed in the background after startup; see import_crypto_modules()
+
+IMPORTS_DONE = time.perf_counter()
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection, opened per worker process by connect_db() in the lifespan
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def connect_db():
+    global client, db
+    # tz_aware so dates come back as UTC datetimes without per-row fixing
+    client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+
+# ============= JSON RESPONSES =============
+# Read paths return MongoJSONResponse with documents exactly as Mongo hands
+# them back (projected without `_id`). Returning a Response skips FastAPI's
+# jsonable_encoder pass and response_model validation, so the declared
+# response models only describe the OpenAPI schema for those routes.
+
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; datetimes come out as ISO 8601 in UTC"""
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # ============= MODELS =============
@@ -57,10 +96,10 @@ class Show(BaseModel):
     added_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Episode(BaseModel):
+    """Shared catalog episode, stored once per TVMaze episode for all users"""
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    show_id: str
+    id: str
+    tvmaze_show_id: int
     tvmaze_episode_id: int
     season: int
     number: int
@@ -69,14 +108,23 @@ class Episode(BaseModel):
     airstamp: Optional[str] = None
     runtime: Optional[int] = None
     summary: Optional[str] = None
-    watched: bool = False
-    watched_at: Optional[datetime] = None
+    # airstamp as a BSON date, for range scans by the notification engine
+    airstamp_at: Optional[datetime] = None
+
+class WatchedEpisode(BaseModel):
+    """Per-user watch state; only watched episodes have a document"""
+    model_config = ConfigDict(extra="ignore")
+    user_id: str
+    show_id: str
+    episode_id: str
+    watched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Notification(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     show_id: str
+    episode_id: Optional[str] = None
     show_name: str
     episode_name: str
     season: int
@@ -86,25 +134,709 @@ class Notification(BaseModel):
     read: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ShowProgress(BaseModel):
+    watched_count: int = 0
+    total_count: int = 0
+    next_unwatched: Optional[dict] = None
+
+class FavoriteShow(Show):
+    progress: ShowProgress
+
+class EpisodeWithWatchState(Episode):
+    """Catalog episode merged with the user's watch state; `fields`/`compact` may omit any field"""
+    user_id: str
+    show_id: str
+    watched: bool = False
+    watched_at: Optional[datetime] = None
+
+class SeasonEpisodes(BaseModel):
+    season: int
+    episodes: List[EpisodeWithWatchState]
+
+class UpcomingEpisode(EpisodeWithWatchState):
+    show_name: str
+    show_image: Optional[str] = None
+
+# ============= OUTBOUND HTTP =============
+# One long-lived httpx client for TVMaze, Apple and the Emergent auth service,
+# created at startup and closed at shutdown, so connections are reused.
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "false").lower() == "true"
+
+# Retried for idempotent requests, along with transport errors
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+class LatencyHistogram:
+    """Request latency histogram with fixed millisecond buckets"""
+    
+    BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+    
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.total += 1
+        self.sum_ms += ms
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+    
+    def snapshot(self) -> dict:
+        buckets = {f"le_{bound}ms": count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets["gt_10000ms"] = self.counts[-1]
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 2) if self.total else None,
+            "buckets": buckets
+        }
+
+class HostStats:
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiters = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency = LatencyHistogram()
+
+class HTTPClientPool:
+    """
+    Application-scoped httpx client with keep-alive pooling, optional HTTP/2,
+    a per-host concurrency cap, retries for idempotent requests and metrics.
+    """
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._hosts: dict = {}
+    
+    def _http2_available(self) -> bool:
+        if not HTTP2_ENABLED:
+            return False
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logging.warning("HTTP2_ENABLED is set but the h2 package is not installed; using HTTP/1.1")
+            return False
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self.start()
+        return self._client
+    
+    def start(self):
+        if self._client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+        )
+        http2 = self._http2_available()
+        # Transport-level retries cover connection failures only
+        self._transport = httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=HTTP_RETRIES)
+        self._client = httpx.AsyncClient(
+            transport=self._transport,
+            http2=http2,
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+        )
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._transport = None
+    
+    def _host_stats(self, host: str) -> HostStats:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats(HTTP_MAX_CONNECTIONS_PER_HOST)
+        return stats
+    
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the shared client; GETs are retried on transient failures"""
+        stats = self._host_stats(httpx.URL(url).host)
+        attempts = 1 + (HTTP_RETRIES if method.upper() == "GET" else 0)
+        
+        for attempt in range(attempts):
+            stats.waiters += 1
+            try:
+                await stats.semaphore.acquire()
+            finally:
+                stats.waiters -= 1
+            stats.in_flight += 1
+            stats.requests += 1
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                stats.errors += 1
+                if attempt + 1 == attempts:
+                    raise
+                response = None
+            finally:
+                stats.latency.observe(time.perf_counter() - started)
+                stats.in_flight -= 1
+                stats.semaphore.release()
+            
+            if response is not None and (response.status_code not in RETRYABLE_STATUS_CODES or attempt + 1 == attempts):
+                return response
+            stats.retries += 1
+            await asyncio.sleep(0.2 * 2 ** attempt)
+    
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+    
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+    
+    def metrics(self) -> dict:
+        pool = {"open_connections": None, "idle_connections": None, "queued_requests": None}
+        # httpcore's pool internals are private; report them when available
+        core_pool = getattr(self._transport, "_pool", None)
+        connections = getattr(core_pool, "connections", None)
+        if connections is not None:
+            pool["open_connections"] = len(connections)
+            pool["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+        requests = getattr(core_pool, "_requests", None)
+        if requests is not None:
+            pool["queued_requests"] = sum(1 for req in requests if req.is_queued())
+        return {
+            "pool": pool,
+            "hosts": {
+                host: {
+                    "in_flight": stats.in_flight,
+                    "waiters": stats.waiters,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "latency": stats.latency.snapshot()
+                }
+                for host, stats in self._hosts.items()
+            }
+        }
+
+http_pool = HTTPClientPool()
+
+# ============= TVMAZE CLIENT =============
+# TVMaze rate-limits per IP (about 20 calls per 10 seconds) and every call we
+# make comes from one IP, so all TVMaze requests share one token bucket. With
+# several workers the bucket also draws from a counter in shared_state (see
+# SHARED STATE), or each worker gets its share of the limit without Redis.
+
+TVMAZE_API_URL = "https://api.tvmaze.com"
+TVMAZE_RATE_LIMIT_CALLS = int(os.environ.get("TVMAZE_RATE_LIMIT_CALLS", "20"))
+TVMAZE_RATE_LIMIT_PERIOD_SECONDS = float(os.environ.get("TVMAZE_RATE_LIMIT_PERIOD_SECONDS", "10"))
+TVMAZE_MAX_429_RETRIES = int(os.environ.get("TVMAZE_MAX_429_RETRIES", "3"))
+# Shared budget is counted in fixed windows this long, so bursts across a
+# window boundary stay close to the limit
+TVMAZE_SHARED_WINDOW_SECONDS = 1.0
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+class TokenBucketLimiter:
+    """
+    Token bucket with priority lanes. Waiters are granted tokens lowest
+    priority value first and FIFO within a lane. pause() holds every lane,
+    e.g. for an upstream Retry-After. After share() every grant is also
+    counted against a fixed-window budget in a KV store, which bounds the
+    combined rate of all processes sharing it.
+    """
+    
+    def __init__(self, calls: int, period: float):
+        self.capacity = calls
+        self.rate = calls / period
+        self._tokens = float(calls)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.wait_times = {priority: LatencyHistogram() for priority in PRIORITY_NAMES}
+        self.pauses = 0
+        self._shared = None
+        self._shared_window = 0.0
+        self._shared_calls = 0
+        self.shared_waits = 0
+    
+    def share(self, store: "KVNamespace", window: float):
+        """Enforce the rate across every process using the same store"""
+        self._shared = store
+        self._shared_window = window
+        self._shared_calls = max(1, int(self.rate * window))
+    
+    def split(self, parts: int):
+        """Keep 1/parts of the rate, for when the limit can't be shared"""
+        self.capacity = max(1, self.capacity // parts)
+        self.rate /= parts
+        self._tokens = min(self._tokens, self.capacity)
+    
+    async def _claim_shared(self) -> float:
+        """Count one call against the shared budget; seconds to wait if it's spent"""
+        now = time.time()
+        window = int(now // self._shared_window)
+        try:
+            count = await self._shared.incr(str(window), 1, ttl=self._shared_window * 2)
+        except Exception as e:
+            # The local bucket still applies
+            logging.error(f"Failed to count TVMaze call in shared budget: {e}")
+            return 0.0
+        if count <= self._shared_calls:
+            return 0.0
+        self.shared_waits += 1
+        return (window + 1) * self._shared_window - now
+    
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND):
+        started = time.monotonic()
+        self._refill(started)
+        if self._shared is None and not self._waiters and self._tokens >= 1 and started >= self._paused_until:
+            self._tokens -= 1
+            self.wait_times[priority].observe(0)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+        self.wait_times[priority].observe(time.monotonic() - started)
+    
+    async def _dispatch(self):
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            if self._waiters[0][2].done():
+                # Waiter was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            if self._shared is not None:
+                wait = await self._claim_shared()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+    
+    def pause(self, seconds: float):
+        """Hold all lanes for the given time and drop accumulated tokens"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self.pauses += 1
+    
+    def metrics(self) -> dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+        return {
+            "tokens": round(self._tokens, 2),
+            "queue_depth": depth,
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "pauses": self.pauses,
+            "shared": self._shared is not None,
+            "shared_waits": self.shared_waits,
+            "wait_time": {PRIORITY_NAMES[p]: hist.snapshot() for p, hist in self.wait_times.items()}
+        }
+
+tvmaze_limiter = TokenBucketLimiter(TVMAZE_RATE_LIMIT_CALLS, TVMAZE_RATE_LIMIT_PERIOD_SECONDS)
+
+def retry_after_seconds(response: httpx.Response, default: float) -> float:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+async def tvmaze_get(path: str, priority: int = PRIORITY_BACKGROUND, **kwargs) -> httpx.Response:
+    """
+    GET a TVMaze API path through the shared rate limiter. A 429 pauses the
+    limiter for Retry-After (or an exponential backoff) and the call is
+    retried; the final response is returned either way.
+    """
+    for attempt in range(TVMAZE_MAX_429_RETRIES + 1):
+        await tvmaze_limiter.acquire(priority)
+        response = await http_pool.get(f"{TVMAZE_API_URL}{path}", **kwargs)
+        if response.status_code != 429 or attempt == TVMAZE_MAX_429_RETRIES:
+            return response
+        delay = retry_after_seconds(response, default=2 ** attempt)
+        logging.warning(f"TVMaze rate limited {path}; retrying in {delay:.1f}s")
+        tvmaze_limiter.pause(delay)
+    return response
+
+# ============= CACHING =============
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire at a per-entry deadline"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, deadline = entry
+        if deadline <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+    
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches predicate"""
+        for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+            del self._data[key]
+    
+    def clear(self):
+        self._data.clear()
+    
+    def metrics(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+# ============= SHARED STATE =============
+# Key/value store with per-key TTLs for state that has to be visible to every
+# worker and replica (OAuth states, shared caches, rate-limit counters). With
+# REDIS_URL set it uses Redis through redis-py; otherwise it falls back to a
+# per-process store. Values are JSON.
+
+REDIS_URL = os.environ.get("REDIS_URL", "")
+REDIS_POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", "10"))
+REDIS_TIMEOUT_SECONDS = float(os.environ.get("REDIS_TIMEOUT_SECONDS", "5"))
+# Retries, with backoff, of a command that failed on a dropped connection or timeout
+REDIS_RETRIES = int(os.environ.get("REDIS_RETRIES", "2"))
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+class KVStore:
+    """Interface shared by the in-memory and Redis stores; TTLs are in seconds"""
+    
+    async def get(self, key: str):
+        raise NotImplementedError
+    
+    async def set(self, key: str, value, ttl: float, nx: bool = False) -> bool:
+        """Store value for ttl seconds; with nx only if key is absent. Returns whether it was stored."""
+        raise NotImplementedError
+    
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+    
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to an integer counter; ttl applies when the counter is created"""
+        raise NotImplementedError
+    
+    async def aclose(self):
+        pass
+    
+    def metrics(self) -> dict:
+        return {}
+    
+    def namespace(self, prefix: str) -> "KVNamespace":
+        return KVNamespace(self, prefix)
+
+class KVNamespace:
+    """View of a KVStore with every key prefixed, so callers can't collide"""
+    
+    def __init__(self, store: KVStore, prefix: str):
+        self.store = store
+        self.prefix = f"{prefix}:"
+    
+    async def get(self, key: str):
+        return await self.store.get(self.prefix + key)
+    
+    async def set(self, key: str, value, ttl: float, nx: bool = False) -> bool:
+        return await self.store.set(self.prefix + key, value, ttl, nx)
+    
+    async def delete(self, key: str) -> bool:
+        return await self.store.delete(self.prefix + key)
+    
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await self.store.incr(self.prefix + key, amount, ttl)
+
+class InMemoryKVStore(KVStore):
+    """
+    Per-process store. Deadlines sit in a min-heap, so each operation expires
+    what is due in O(log n) per key instead of scanning every entry.
+    """
+    
+    def __init__(self):
+        self._data = {}
+        self._deadlines = []
+        self._seq = itertools.count()
+        self.expired = 0
+    
+    def _expire(self):
+        now = time.monotonic()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._deadlines)
+            entry = self._data.get(key)
+            # Overwritten keys leave their old deadline behind; skip those
+            if entry is not None and entry[1] == deadline:
+                del self._data[key]
+                self.expired += 1
+        # Keep the heap from filling up with stale deadlines of overwritten keys
+        if len(self._deadlines) > 2 * len(self._data) + 1024:
+            self._deadlines = [(entry[1], next(self._seq), key) for key, entry in self._data.items()]
+            heapq.heapify(self._deadlines)
+    
+    def _store(self, key: str, value, ttl: float):
+        deadline = time.monotonic() + ttl
+        self._data[key] = (value, deadline)
+        heapq.heappush(self._deadlines, (deadline, next(self._seq), key))
+    
+    async def get(self, key: str):
+        self._expire()
+        entry = self._data.get(key)
+        return entry[0] if entry else None
+    
+    async def set(self, key: str, value, ttl: float, nx: bool = False) -> bool:
+        self._expire()
+        if nx and key in self._data:
+            return False
+        self._store(key, value, ttl)
+        return True
+    
+    async def delete(self, key: str) -> bool:
+        self._expire()
+        return self._data.pop(key, None) is not None
+    
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        self._expire()
+        entry = self._data.get(key)
+        if entry is None:
+            value = amount
+            if ttl is None:
+                # No expiry: a deadline that never comes due
+                self._data[key] = (value, float("inf"))
+            else:
+                self._store(key, value, ttl)
+        else:
+            value = entry[0] + amount
+            self._data[key] = (value, entry[1])
+        return value
+    
+    def metrics(self) -> dict:
+        return {"backend": "memory", "keys": len(self._data), "expired": self.expired}
+
+class RedisKVStore(KVStore):
+    """
+    Store backed by Redis through redis.asyncio, which pools connections,
+    reconnects with backoff and handles TLS for rediss:// URLs. Expiry is
+    left to Redis (SET ... PX), so nothing is scanned on our side.
+    """
+    
+    def __init__(self, url: str, pool_size: int = REDIS_POOL_SIZE, timeout: float = REDIS_TIMEOUT_SECONDS):
+        # Only needed when REDIS_URL is set
+        import redis.asyncio as aioredis
+        from redis.asyncio.retry import Retry
+        from redis.backoff import ExponentialBackoff
+        from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+        
+        # Waits for a free connection instead of failing when all are busy
+        self._pool = aioredis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=pool_size,
+            timeout=timeout,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            retry=Retry(ExponentialBackoff(cap=1.0, base=0.05), REDIS_RETRIES),
+            retry_on_error=[RedisConnectionError, RedisTimeoutError]
+        )
+        self._redis = aioredis.Redis(connection_pool=self._pool)
+        self.commands = 0
+        self.errors = 0
+    
+    async def _call(self, command: str, *args, **kwargs):
+        try:
+            reply = await getattr(self._redis, command)(*args, **kwargs)
+        except Exception:
+            self.errors += 1
+            raise
+        self.commands += 1
+        return reply
+    
+    async def get(self, key: str):
+        data = await self._call("get", key)
+        return None if data is None else orjson.loads(data)
+    
+    async def set(self, key: str, value, ttl: float, nx: bool = False) -> bool:
+        # SET NX answers nil when the key exists
+        return bool(await self._call("set", key, orjson.dumps(value), px=max(1, int(ttl * 1000)), nx=nx))
+    
+    async def delete(self, key: str) -> bool:
+        return await self._call("delete", key) > 0
+    
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = await self._call("incrby", key, amount)
+        if ttl is not None and value == amount:
+            # We created the counter, so we give it its expiry
+            await self._call("pexpire", key, max(1, int(ttl * 1000)))
+        return value
+    
+    async def aclose(self):
+        await self._redis.aclose()
+        await self._pool.disconnect()
+    
+    def metrics(self) -> dict:
+        return {
+            "backend": "redis",
+            "max_connections": self._pool.max_connections,
+            "commands": self.commands,
+            "errors": self.errors
+        }
+
+def create_kv_store(url: str) -> KVStore:
+    return RedisKVStore(url) if url else InMemoryKVStore()
+
+shared_state = create_kv_store(REDIS_URL)
+
+if REDIS_URL:
+    tvmaze_limiter.share(shared_state.namespace("tvmaze_rate"), TVMAZE_SHARED_WINDOW_SECONDS)
+elif WEB_CONCURRENCY > 1:
+    # Workers can't see each other's calls, so each stays within its share
+    tvmaze_limiter.split(WEB_CONCURRENCY)
+
 # ============= AUTH DEPENDENCIES =============
 
+# Session token -> User. Entries never outlive the session's expires_at. The
+# cache is per process: logouts and account deletions leave a revocation
+# marker in shared_state that every worker checks on a cache hit. Without
+# Redis those markers are per process too, so multi-worker deployments fall
+# back to a TTL of a few seconds.
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get(
+    "SESSION_CACHE_TTL_SECONDS",
+    "60" if REDIS_URL or WEB_CONCURRENCY == 1 else "5"
+))
+SESSION_CACHE_MAX_SIZE = int(os.environ.get("SESSION_CACHE_MAX_SIZE", "10000"))
+session_cache = TTLCache(SESSION_CACHE_MAX_SIZE, SESSION_CACHE_TTL_SECONDS)
+# A marker only has to outlive the cache entries it revokes
+revoked_sessions = shared_state.namespace("revoked_session")
+revoked_users = shared_state.namespace("revoked_user")
+
+async def invalidate_cached_session(session_token: Optional[str]):
+    if session_token:
+        session_cache.pop(session_token)
+        try:
+            await revoked_sessions.set(session_token, 1, ttl=SESSION_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logging.error(f"Failed to publish session revocation: {e}")
+
+async def invalidate_cached_user(user_id: str):
+    session_cache.discard_where(lambda user: user.id == user_id)
+    try:
+        await revoked_users.set(user_id, 1, ttl=SESSION_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logging.error(f"Failed to publish revocation for user {user_id}: {e}")
+
+async def is_cached_session_revoked(session_token: str, user_id: str) -> bool:
+    """Whether another worker revoked a session this worker has cached"""
+    try:
+        session_revoked, user_revoked = await asyncio.gather(
+            revoked_sessions.get(session_token),
+            revoked_users.get(user_id)
+        )
+    except Exception as e:
+        # Can't tell; let the caller go to the database
+        logging.error(f"Failed to check session revocations: {e}")
+        return True
+    return session_revoked is not None or user_revoked is not None
+
+def get_request_session_token(request: Request, session_token: Optional[str]) -> Optional[str]:
+    """Session token from the cookie, falling back to the Authorization header"""
+    if session_token:
+        return session_token
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header.replace("Bearer ", "")
+    return None
+
 async def get_current_user(request: Request, session_token: Optional[str] = Cookie(None)) -> User:
     """Get current user from session token (cookie or Authorization header)"""
-    token = session_token
-    
-    # Fallback to Authorization header if cookie not present
-    if not token:
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.replace("Bearer ", "")
+    token = get_request_session_token(request, session_token)
     
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    # Find session
-    session = await db.user_sessions.find_one({"session_token": token})
-    if not session:
+    cached_user = session_cache.get(token)
+    if cached_user is not None:
+        if not await is_cached_session_revoked(token, cached_user.id):
+            return cached_user
+        session_cache.pop(token)
+    
+    # Find session and its user in one round trip
+    results = await db.user_sessions.aggregate([
+        {"$match": {"session_token": token}},
+        {"$limit": 1},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$project": {"_id": 0, "expires_at": 1, "user": {"$arrayElemAt": ["$user", 0]}}}
+    ]).to_list(1)
+    if not results:
         raise HTTPException(status_code=401, detail="Invalid session")
+    session = results[0]
     
     # Check expiry
     expires_at = session.get("expires_at")
@@ -115,13 +847,14 @@ async def get_current_user(request: Request, session_token: Optional[str] = Cook
     if expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
     
-    if expires_at < datetime.now(timezone.utc):
+    now = datetime.now(timezone.utc)
+    if expires_at < now:
         raise HTTPException(status_code=401, detail="Session expired")
     
-    # Get user
-    user_doc = await db.users.find_one({"id": session["user_id"]}, {"_id": 0})
+    user_doc = session.get("user")
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
+    user_doc.pop("_id", None)
     
     # Convert ISO strings to datetime if needed
     if isinstance(user_doc.get("created_at"), str):
@@ -130,7 +863,117 @@ async def get_current_user(request: Request, session_token: Optional[str] = Cook
         if user_doc["created_at"].tzinfo is None:
             user_doc["created_at"] = user_doc["created_at"].replace(tzinfo=timezone.utc)
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.set(token, user, ttl=(expires_at - now).total_seconds())
+    return user
+
+# ============= APPLE JWKS CACHE =============
+
+APPLE_KEYS_URL = "https://appleid.apple.com/auth/keys"
+APPLE_ISSUER = "https://appleid.apple.com"
+APPLE_NATIVE_AUDIENCE = "com.tillywatchwhistle"
+# Used when Apple's response carries no Cache-Control max-age
+APPLE_JWKS_DEFAULT_TTL_SECONDS = int(os.environ.get("APPLE_JWKS_DEFAULT_TTL_SECONDS", "3600"))
+# Unknown kids trigger a refresh at most this often, so forged tokens can't hammer Apple
+APPLE_JWKS_MIN_REFRESH_SECONDS = 60
+
+class AppleJWKSCache:
+    """
+    In-memory cache of Apple's public keys, already converted to PEM and keyed
+    by kid. Honours Cache-Control max-age, refreshes when it sees an unknown
+    kid, and lets only one refresh run at a time (callers waiting on it reuse
+    its result). If a refresh fails after max-age, the cached keys keep being
+    served and the refresh is retried a minute later.
+    """
+    
+    def __init__(self, url: str):
+        self.url = url
+        self._keys: dict = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+    
+    async def get_key(self, kid: str) -> Optional[str]:
+        """Return the PEM public key for kid, refreshing the key set if needed"""
+        now = time.monotonic()
+        if kid in self._keys and now < self._expires_at:
+            self.hits += 1
+            return self._keys[kid]
+        
+        self.misses += 1
+        await self._refresh(unknown_kid=kid not in self._keys)
+        return self._keys.get(kid)
+    
+    async def _refresh(self, unknown_kid: bool):
+        seen_fetch = self._fetched_at
+        async with self._lock:
+            if self._fetched_at != seen_fetch:
+                # Another caller refreshed while we waited for the lock
+                return
+            now = time.monotonic()
+            if not unknown_kid and now < self._expires_at:
+                # A failed refresh we waited on pushed the expiry out
+                return
+            if unknown_kid and now < self._expires_at and now - self._fetched_at < APPLE_JWKS_MIN_REFRESH_SECONDS:
+                return
+            
+            from jose import jwk
+            
+            try:
+                response = await http_pool.get(self.url)
+                response.raise_for_status()
+                keys = {}
+                for key in response.json()["keys"]:
+                    keys[key["kid"]] = jwk.construct(key).to_pem().decode()
+            except Exception as e:
+                self.refresh_failures += 1
+                if unknown_kid or not self._keys:
+                    raise
+                # Apple rotates keys rarely; the ones we have are still good for sign-in
+                logging.error(f"Failed to refresh Apple JWKS, serving cached keys: {e}")
+                self._expires_at = time.monotonic() + APPLE_JWKS_MIN_REFRESH_SECONDS
+                return
+            
+            max_age = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+            ttl = int(max_age.group(1)) if max_age else APPLE_JWKS_DEFAULT_TTL_SECONDS
+            
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + ttl
+            self.refreshes += 1
+    
+    def metrics(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures
+        }
+
+apple_jwks_cache = AppleJWKSCache(APPLE_KEYS_URL)
+
+async def verify_apple_identity_token(identity_token: str, audience: str) -> dict:
+    """Verify an Apple identity token's signature, audience and expiry; returns its claims"""
+    import jwt
+    
+    kid = jwt.get_unverified_header(identity_token).get("kid")
+    public_key = await apple_jwks_cache.get_key(kid)
+    if not public_key:
+        raise HTTPException(status_code=401, detail="Invalid Apple token")
+    
+    return jwt.decode(
+        identity_token,
+        public_key,
+        algorithms=["RS256"],
+        audience=audience,
+        issuer=APPLE_ISSUER,
+        options={"verify_exp": True}
+    )
 
 # ============= AUTH ROUTES =============
 
@@ -147,38 +990,11 @@ class AppleSignInRequest(BaseModel):
 async def apple_signin(request: AppleSignInRequest, response: Response):
     """Handle Apple Sign In authentication"""
     import jwt
-    import httpx
-    from jose import jwk
     from jose.exceptions import JWTError
     
     try:
-        # Decode the JWT header to get the key ID
-        unverified_header = jwt.get_unverified_header(request.identityToken)
-        kid = unverified_header.get('kid')
-        
-        # Fetch Apple's public keys
-        async with httpx.AsyncClient() as client:
-            keys_response = await client.get('https://appleid.apple.com/auth/keys')
-            apple_keys = keys_response.json()
-        
-        # Find the matching public key
-        public_key = None
-        for key in apple_keys['keys']:
-            if key['kid'] == kid:
-                public_key = jwk.construct(key)
-                break
-        
-        if not public_key:
-            raise HTTPException(status_code=401, detail="Invalid Apple token")
-        
-        # Verify and decode the token
-        decoded = jwt.decode(
-            request.identityToken,
-            public_key.to_pem().decode(),
-            algorithms=['RS256'],
-            audience='com.tillywatchwhistle',
-            options={"verify_exp": True}
-        )
+        # Verify and decode the token against Apple's cached public keys
+        decoded = await verify_apple_identity_token(request.identityToken, APPLE_NATIVE_AUDIENCE)
         
         apple_user_id = decoded.get('sub')
         email = decoded.get('email') or request.email
@@ -246,7 +1062,7 @@ async def apple_signin(request: AppleSignInRequest, response: Response):
         session_dict = session.model_dump()
         session_dict["expires_at"] = session_dict["expires_at"].isoformat()
         session_dict["created_at"] = session_dict["created_at"].isoformat()
-        await db.sessions.insert_one(session_dict)
+        await db.user_sessions.insert_one(session_dict)
         
         # Set cookie
         response.set_cookie(
@@ -266,7 +1082,9 @@ async def apple_signin(request: AppleSignInRequest, response: Response):
             "name": user_name
         }
         
-    except JWTError as e:
+    except HTTPException:
+        raise
+    except (JWTError, jwt.InvalidTokenError) as e:
         logging.error(f"JWT verification failed: {e}")
         raise HTTPException(status_code=401, detail="Invalid Apple token")
     except Exception as e:
@@ -280,8 +1098,9 @@ import secrets
 from fastapi.responses import HTMLResponse
 from urllib.parse import urlencode
 
-# Store OAuth states (in production, use Redis)
-apple_oauth_states = {}
+# OAuth states live in the shared store so the callback can land on any worker
+APPLE_OAUTH_STATE_TTL_SECONDS = 600
+apple_oauth_states = shared_state.namespace("apple_oauth_state")
 
 # Apple OAuth Configuration
 APPLE_SERVICE_ID = "com.tillywatchwhistle.web"  # Your Services ID from Apple Developer
@@ -294,36 +1113,79 @@ def get_apple_redirect_uri():
     backend_url = os.environ.get("BACKEND_URL", "https://watchwhistle-production.up.railway.app")
     return f"{backend_url}/api/auth/apple/callback"
 
-def generate_apple_client_secret():
-    """Generate JWT client secret for Apple token exchange"""
-    import jwt as pyjwt
-    
-    if not APPLE_TEAM_ID or not APPLE_KEY_ID or not APPLE_PRIVATE_KEY:
-        return None
-    
-    now = datetime.now(timezone.utc)
-    payload = {
-        "iss": APPLE_TEAM_ID,
-        "sub": APPLE_SERVICE_ID,
-        "aud": "https://appleid.apple.com",
-        "iat": now,
-        "exp": now + timedelta(minutes=5),
-    }
+# Apple accepts client secrets valid for up to 6 months (15777000 seconds)
+APPLE_CLIENT_SECRET_MAX_LIFETIME_SECONDS = 15777000
+APPLE_CLIENT_SECRET_LIFETIME_SECONDS = min(
+    int(os.environ.get("APPLE_CLIENT_SECRET_LIFETIME_SECONDS", str(30 * 24 * 3600))),
+    APPLE_CLIENT_SECRET_MAX_LIFETIME_SECONDS
+)
+
+class AppleClientSecret:
+    """
+    Client secret JWT for Apple's token endpoint. The private key is parsed
+    once and the signed secret is reused until shortly before its exp, so
+    ES256 signing happens once per lifetime instead of once per login.
+    """
     
-    # The private key should be in PEM format
-    private_key = APPLE_PRIVATE_KEY.replace("\\n", "\n")
+    def __init__(self, lifetime: int):
+        self.lifetime = lifetime
+        # Re-sign a tenth of the lifetime (at most an hour) before exp
+        self.renew_margin = min(3600, lifetime // 10)
+        self._private_key = None
+        self._secret: Optional[str] = None
+        self._expires_at = 0.0
+        self.signed = 0
+    
+    def _load_private_key(self):
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+        
+        # The private key should be in PEM format
+        pem = APPLE_PRIVATE_KEY.replace("\\n", "\n").encode()
+        return load_pem_private_key(pem, password=None)
+    
+    def get(self) -> Optional[str]:
+        if not APPLE_TEAM_ID or not APPLE_KEY_ID or not APPLE_PRIVATE_KEY:
+            return None
+        if self._secret and time.time() < self._expires_at - self.renew_margin:
+            return self._secret
+        
+        try:
+            import jwt as pyjwt
+            
+            if self._private_key is None:
+                self._private_key = self._load_private_key()
+            now = int(time.time())
+            payload = {
+                "iss": APPLE_TEAM_ID,
+                "sub": APPLE_SERVICE_ID,
+                "aud": "https://appleid.apple.com",
+                "iat": now,
+                "exp": now + self.lifetime,
+            }
+            self._secret = pyjwt.encode(
+                payload,
+                self._private_key,
+                algorithm="ES256",
+                headers={"kid": APPLE_KEY_ID}
+            )
+        except Exception as e:
+            logging.error(f"Failed to generate Apple client secret: {e}")
+            return None
+        self._expires_at = payload["exp"]
+        self.signed += 1
+        return self._secret
     
-    try:
-        client_secret = pyjwt.encode(
-            payload,
-            private_key,
-            algorithm="ES256",
-            headers={"kid": APPLE_KEY_ID}
-        )
-        return client_secret
-    except Exception as e:
-        logging.error(f"Failed to generate Apple client secret: {e}")
-        return None
+    def metrics(self) -> dict:
+        return {
+            "signed": self.signed,
+            "expires_at": datetime.fromtimestamp(self._expires_at, timezone.utc).isoformat() if self._secret else None
+        }
+
+apple_client_secret = AppleClientSecret(APPLE_CLIENT_SECRET_LIFETIME_SECONDS)
+
+def generate_apple_client_secret():
+    """JWT client secret for Apple token exchange, reused until shortly before it expires"""
+    return apple_client_secret.get()
 
 @api_router.get("/auth/apple/login")
 async def initiate_apple_web_auth():
@@ -333,17 +1195,12 @@ async def initiate_apple_web_auth():
     """
     # Generate secure state parameter for CSRF protection
     state = secrets.token_urlsafe(32)
-    apple_oauth_states[state] = {
-        "created_at": datetime.now(timezone.utc),
-        "used": False
-    }
-    
-    # Clean up old states (older than 10 minutes)
-    cutoff = datetime.now(timezone.utc) - timedelta(minutes=10)
-    expired_states = [s for s, data in apple_oauth_states.items() 
-                      if data["created_at"] < cutoff]
-    for s in expired_states:
-        del apple_oauth_states[s]
+    # Expires on its own after 10 minutes
+    await apple_oauth_states.set(
+        state,
+        {"created_at": datetime.now(timezone.utc).isoformat()},
+        APPLE_OAUTH_STATE_TTL_SECONDS
+    )
     
     params = {
         "response_type": "code id_token",
@@ -411,8 +1268,9 @@ async def handle_apple_web_callback(request: Request, response: Response):
         """)
     
     # Validate state parameter (CSRF protection)
-    if state and state in apple_oauth_states:
-        if apple_oauth_states[state]["used"]:
+    # The first callback to claim a known state wins; replays see it as used
+    if state and await apple_oauth_states.get(state) is not None:
+        if not await apple_oauth_states.set(f"{state}:used", True, APPLE_OAUTH_STATE_TTL_SECONDS, nx=True):
             return HTMLResponse(content="""
             <html>
                 <head><meta name="viewport" content="width=device-width, initial-scale=1"></head>
@@ -423,14 +1281,11 @@ async def handle_apple_web_callback(request: Request, response: Response):
                 </body>
             </html>
             """)
-        apple_oauth_states[state]["used"] = True
     
     try:
-        import jwt as pyjwt
-        
-        # Decode the ID token (Apple provides it directly in form_post mode)
-        # For production, validate signature against Apple's JWKS
-        decoded = pyjwt.decode(id_token, options={"verify_signature": False})
+        # Verify the ID token (Apple provides it directly in form_post mode)
+        # against the cached JWKS; no key download per login
+        decoded = await verify_apple_identity_token(id_token, APPLE_SERVICE_ID)
         
         apple_user_id = decoded.get("sub")
         email = decoded.get("email")
@@ -442,7 +1297,6 @@ async def handle_apple_web_callback(request: Request, response: Response):
         full_name = "Apple User"
         if user_data_str:
             try:
-                import json
                 user_info = json.loads(user_data_str)
                 name_info = user_info.get("name", {})
                 first_name = name_info.get("firstName", "")
@@ -661,16 +1515,15 @@ async def create_session(request: Request, response: Response):
         raise HTTPException(status_code=400, detail="X-Session-ID header required")
     
     # Call Emergent auth service
-    async with httpx.AsyncClient() as client:
-        try:
-            auth_response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            auth_response.raise_for_status()
-            auth_data = auth_response.json()
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to validate session: {str(e)}")
+    try:
+        auth_response = await http_pool.get(
+            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+            headers={"X-Session-ID": session_id}
+        )
+        auth_response.raise_for_status()
+        auth_data = auth_response.json()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to validate session: {str(e)}")
     
     # Check if user exists
     user_doc = await db.users.find_one({"email": auth_data["email"]}, {"_id": 0})
@@ -723,46 +1576,387 @@ async def create_session(request: Request, response: Response):
     
     return {"user": user.model_dump(), "session_token": session_token}
 
-@api_router.get("/auth/me")
+@api_router.get("/auth/me", response_model=User)
 async def get_me(user: User = Depends(get_current_user)):
     """Get current user info"""
-    return user
+    return MongoJSONResponse(user.model_dump())
 
 @api_router.post("/auth/logout")
-async def logout(response: Response, user: User = Depends(get_current_user), session_token: Optional[str] = Cookie(None)):
+async def logout(request: Request, response: Response, user: User = Depends(get_current_user), session_token: Optional[str] = Cookie(None)):
     """Logout user"""
-    if session_token:
-        await db.user_sessions.delete_one({"session_token": session_token})
+    token = get_request_session_token(request, session_token)
+    if token:
+        await db.user_sessions.delete_one({"session_token": token})
+        await invalidate_cached_session(token)
     
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out successfully"}
 
-@api_router.delete("/users/me")
+# ============= ACCOUNT PURGE =============
+# Deleting an account revokes its sessions and removes the user document in
+# the request; everything else the user owns is purged in the background.
+# Favorites go first: notification fan-out and sync jobs find users through
+# db.shows, so once those are gone nothing writes new data for the user. The
+# remaining collections are then purged side by side in bounded batches, and
+# progress is kept in db.account_purges so an interrupted purge resumes
+# instead of leaving orphans behind.
+
+# Purged one phase after another; collections within a phase run concurrently
+ACCOUNT_PURGE_PHASES = [
+    ["shows"],
+    ["watched_episodes", "show_progress", "episodes", "notifications", "notification_counters"],
+]
+ACCOUNT_PURGE_COLLECTIONS = [collection for phase in ACCOUNT_PURGE_PHASES for collection in phase]
+ACCOUNT_PURGE_BATCH_SIZE = int(os.environ.get("ACCOUNT_PURGE_BATCH_SIZE", "1000"))
+# Collections being purged at once, across all purges in this worker
+ACCOUNT_PURGE_CONCURRENCY = int(os.environ.get("ACCOUNT_PURGE_CONCURRENCY", "4"))
+# Completed purge records are kept this long for the status endpoint
+ACCOUNT_PURGE_RETENTION_SECONDS = 7 * 24 * 3600
+# A purge whose progress hasn't moved for this long is considered interrupted
+ACCOUNT_PURGE_STALE_SECONDS = 120
+ACCOUNT_PURGE_RESUME_INTERVAL_SECONDS = 300
+
+class AccountPurger:
+    def __init__(self, concurrency: int, batch_size: int):
+        self.batch_size = batch_size
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: dict = {}
+        self.completed = 0
+        self.failed = 0
+    
+    def start(self, purge_id: str, user_id: str):
+        if purge_id not in self._tasks:
+            task = asyncio.create_task(self._purge(purge_id, user_id))
+            self._tasks[purge_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(purge_id, None))
+    
+    async def stop(self):
+        # Interrupted purges stay "running" and are resumed by resume_account_purges()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _purge_collection(self, purge_id: str, user_id: str, collection: str):
+        async with self._slots:
+            while True:
+                batch = await db[collection].find({"user_id": user_id}, {"_id": 1}).limit(self.batch_size).to_list(None)
+                if not batch:
+                    break
+                result = await db[collection].delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                await db.account_purges.update_one(
+                    {"id": purge_id},
+                    {
+                        "$inc": {f"collections.{collection}.deleted": result.deleted_count},
+                        "$set": {"updated_at": datetime.now(timezone.utc)}
+                    }
+                )
+            await db.account_purges.update_one(
+                {"id": purge_id},
+                {"$set": {f"collections.{collection}.done": True, "updated_at": datetime.now(timezone.utc)}}
+            )
+    
+    async def _purge(self, purge_id: str, user_id: str):
+        try:
+            purge = await db.account_purges.find_one_and_update(
+                {"id": purge_id},
+                {"$set": {"status": "running", "error": None, "updated_at": datetime.now(timezone.utc)}},
+                projection={"_id": 0, "collections": 1}
+            )
+            if purge is None:
+                return
+            progress = purge.get("collections", {})
+            for phase in ACCOUNT_PURGE_PHASES:
+                pending = [collection for collection in phase if not progress.get(collection, {}).get("done")]
+                await asyncio.gather(*(self._purge_collection(purge_id, user_id, collection) for collection in pending))
+            now = datetime.now(timezone.utc)
+            await db.account_purges.update_one(
+                {"id": purge_id},
+                {"$set": {"status": "completed", "completed_at": now, "updated_at": now}}
+            )
+            self.completed += 1
+            logging.info(f"Purged account data of user {user_id}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Resumed from its recorded progress on the next resume_account_purges()
+            self.failed += 1
+            logging.error(f"Account purge {purge_id} failed: {e}")
+            try:
+                await db.account_purges.update_one(
+                    {"id": purge_id},
+                    {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.now(timezone.utc)}}
+                )
+            except Exception:
+                pass
+    
+    def metrics(self) -> dict:
+        return {"running": len(self._tasks), "completed": self.completed, "failed": self.failed}
+
+account_purger = AccountPurger(ACCOUNT_PURGE_CONCURRENCY, ACCOUNT_PURGE_BATCH_SIZE)
+
+async def resume_account_purges():
+    """Restart purges that a crash, restart or error left unfinished"""
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=ACCOUNT_PURGE_STALE_SECONDS)
+    cursor = db.account_purges.find(
+        {"status": {"$ne": "completed"}, "updated_at": {"$lt": stale_before}},
+        {"_id": 0, "id": 1, "user_id": 1}
+    )
+    async for purge in cursor:
+        logging.info(f"Resuming account purge {purge['id']}")
+        account_purger.start(purge["id"], purge["user_id"])
+
+@api_router.delete("/users/me", status_code=202)
 async def delete_user_account(user: User = Depends(get_current_user)):
-    """Delete user account and all associated data"""
+    """
+    Delete user account and all associated data. Sessions and the user are
+    removed right away; the rest is purged in the background, trackable
+    through GET /api/users/purges/{purge_id}.
+    """
     user_id = user.id
+    now = datetime.now(timezone.utc)
+    purge_id = str(uuid.uuid4())
+    
+    # Record the purge first, so a crash after this point still gets it finished
+    await db.account_purges.insert_one({
+        "id": purge_id,
+        "user_id": user_id,
+        "status": "pending",
+        "collections": {collection: {"deleted": 0, "done": False} for collection in ACCOUNT_PURGE_COLLECTIONS},
+        "error": None,
+        "requested_at": now,
+        "updated_at": now,
+        "completed_at": None
+    })
+    await asyncio.gather(
+        db.user_sessions.delete_many({"user_id": user_id}),
+        db.users.delete_one({"id": user_id})
+    )
+    await invalidate_cached_user(user_id)
+    account_purger.start(purge_id, user_id)
     
-    # Delete all user data from all collections
-    await db.users.delete_one({"id": user_id})
-    await db.user_sessions.delete_many({"user_id": user_id})
-    await db.shows.delete_many({"user_id": user_id})
-    await db.episodes.delete_many({"user_id": user_id})
-    await db.notifications.delete_many({"user_id": user_id})
+    return {"message": "Account deleted successfully", "purge_id": purge_id, "status": "pending"}
+
+@api_router.get("/users/purges/{purge_id}")
+async def get_account_purge_status(purge_id: str):
+    """
+    Progress of an account purge. Not authenticated, since the account's
+    sessions are already gone; the purge id is the unguessable handle.
+    """
+    purge = await db.account_purges.find_one({"id": purge_id}, {"_id": 0, "user_id": 0})
+    if not purge:
+        raise HTTPException(status_code=404, detail="Purge not found")
+    return MongoJSONResponse(purge)
+
+# ============= STREAMED RESPONSES =============
+# List endpoints can stream their results (?stream=ndjson or ?stream=json)
+# straight off the Mongo cursor, so memory per request stays constant and the
+# first byte doesn't wait for the whole result set.
+
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "200"))
+STREAM_MODE_PATTERN = "^(ndjson|json)$"
+
+async def iter_batches(cursor, size: int = STREAM_BATCH_SIZE):
+    """Yield lists of up to `size` documents from a Motor cursor"""
+    cursor.batch_size(size)
+    while True:
+        batch = await cursor.to_list(size)
+        if not batch:
+            return
+        yield batch
+
+def stream_documents(batches, mode: str) -> StreamingResponse:
+    """Stream batches of documents as NDJSON lines or as one chunked JSON array"""
+    async def ndjson():
+        async for batch in batches:
+            yield b"".join(orjson.dumps(doc, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE) for doc in batch)
+    
+    async def json_array():
+        separator = b"["
+        async for batch in batches:
+            for doc in batch:
+                yield separator + orjson.dumps(doc, option=ORJSON_OPTIONS)
+                separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+    
+    if mode == "ndjson":
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    return StreamingResponse(json_array(), media_type="application/json")
+
+# ============= SHOW PROGRESS =============
+# One db.show_progress document per (user, show) holds "watched X of Y" and
+# the next unwatched episode. Watch changes adjust watched_count in place and
+# flag the record stale only when the next episode may have moved; ingestion
+# flags every follower's record stale. Stale records are recomputed on read.
+
+PROGRESS_EPISODE_FIELDS = {"_id": 0, "id": 1, "season": 1, "number": 1, "name": 1, "airdate": 1}
+
+async def compute_show_progress(user_id: str, show_id: str, tvmaze_id: int) -> dict:
+    """Recompute and store the user's progress through a show"""
+    total_count = await db.episode_catalog.count_documents({"tvmaze_show_id": tvmaze_id})
+    watched_ids = list(await get_watched_map(user_id, {"show_id": show_id}))
+    next_unwatched = await db.episode_catalog.find_one(
+        {"tvmaze_show_id": tvmaze_id, "id": {"$nin": watched_ids}},
+        PROGRESS_EPISODE_FIELDS,
+        sort=[("season", 1), ("number", 1)]
+    )
+    progress = {
+        "user_id": user_id,
+        "show_id": show_id,
+        "tvmaze_id": tvmaze_id,
+        "watched_count": len(watched_ids),
+        "total_count": total_count,
+        "next_unwatched": next_unwatched,
+        "stale": False,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.show_progress.update_one(
+        {"user_id": user_id, "show_id": show_id},
+        {"$set": progress},
+        upsert=True
+    )
+    return progress
+
+async def record_watch_change(user_id: str, show_id: str, episode: dict, watched: bool):
+    """Adjust progress after one episode was marked watched or unwatched"""
+    progress = await db.show_progress.find_one(
+        {"user_id": user_id, "show_id": show_id},
+        {"_id": 0, "next_unwatched": 1, "stale": 1}
+    )
+    if progress is None or progress.get("stale"):
+        await db.show_progress.update_one({"user_id": user_id, "show_id": show_id}, {"$set": {"stale": True}}, upsert=True)
+        return
     
-    return {"message": "Account deleted successfully"}
+    next_unwatched = progress.get("next_unwatched")
+    if watched:
+        next_moved = next_unwatched is not None and next_unwatched["id"] == episode["id"]
+    else:
+        next_moved = next_unwatched is None or (
+            (episode["season"], episode["number"]) < (next_unwatched["season"], next_unwatched["number"])
+        )
+    update = {"$inc": {"watched_count": 1 if watched else -1}}
+    if next_moved:
+        update["$set"] = {"stale": True}
+    await db.show_progress.update_one({"user_id": user_id, "show_id": show_id}, update)
+
+async def mark_progress_stale(query: dict):
+    """Flag progress records for recompute, e.g. after a batch update or ingestion"""
+    await db.show_progress.update_many(query, {"$set": {"stale": True}})
+
+async def get_progress_for_shows(user_id: str, shows: list) -> dict:
+    """show_id -> progress for the given shows, recomputing stale or missing records"""
+    progress_by_show = {}
+    async for progress in db.show_progress.find(
+        {"user_id": user_id, "show_id": {"$in": [show["id"] for show in shows]}},
+        {"_id": 0, "user_id": 0}
+    ):
+        progress_by_show[progress["show_id"]] = progress
+    
+    stale = [
+        show for show in shows
+        if show["id"] not in progress_by_show or progress_by_show[show["id"]].get("stale")
+    ]
+    recomputed = await asyncio.gather(*[
+        compute_show_progress(user_id, show["id"], show["tvmaze_id"]) for show in stale
+    ])
+    for progress in recomputed:
+        progress.pop("user_id")
+        progress_by_show[progress["show_id"]] = progress
+    return progress_by_show
 
 # ============= SHOW ROUTES =============
 
+# Fresh results are served as-is; stale ones are served while refreshing in the background
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "300"))
+SEARCH_CACHE_STALE_SECONDS = float(os.environ.get("SEARCH_CACHE_STALE_SECONDS", "3600"))
+SEARCH_CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+SEARCH_CACHE_MAX_SIZE = int(os.environ.get("SEARCH_CACHE_MAX_SIZE", "2000"))
+
+def normalize_search_query(q: str) -> str:
+    """Case- and whitespace-insensitive cache key for a search query"""
+    return " ".join(q.lower().split())
+
+class SearchCache:
+    """
+    Stale-while-revalidate cache for TVMaze search results. Empty results are
+    cached briefly (negative caching) and concurrent lookups of the same
+    query share one upstream call.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float, stale: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Values are (results, fresh_until); entries are dropped once past the stale window
+        self._cache = TTLCache(maxsize, ttl + stale)
+        self._in_flight: dict = {}
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+    
+    async def get(self, query: str, fetch) -> list:
+        entry = self._cache.get(query)
+        if entry is not None:
+            results, fresh_until = entry
+            if time.monotonic() >= fresh_until:
+                self.stale_hits += 1
+                self._load(query, fetch)
+            return results
+        return await asyncio.shield(self._load(query, fetch))
+    
+    def _load(self, query: str, fetch) -> asyncio.Task:
+        task = self._in_flight.get(query)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.create_task(self._fetch(query, fetch))
+        self._in_flight[query] = task
+        task.add_done_callback(lambda t: self._done(query, t))
+        return task
+    
+    def _done(self, query: str, task: asyncio.Task):
+        self._in_flight.pop(query, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+    
+    async def _fetch(self, query: str, fetch) -> list:
+        results = await fetch(query)
+        ttl = self.ttl if results else self.negative_ttl
+        self._cache.set(query, (results, time.monotonic() + ttl), ttl=None if results else ttl)
+        return results
+    
+    def metrics(self) -> dict:
+        return {
+            **self._cache.metrics(),
+            "stale_hits": self.stale_hits,
+            "coalesced": self.coalesced,
+            "refresh_errors": self.refresh_errors
+        }
+
+search_cache = SearchCache(
+    SEARCH_CACHE_MAX_SIZE,
+    SEARCH_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_STALE_SECONDS,
+    SEARCH_CACHE_NEGATIVE_TTL_SECONDS
+)
+
+async def fetch_tvmaze_search(query: str) -> list:
+    response = await tvmaze_get("/search/shows", priority=PRIORITY_INTERACTIVE, params={"q": query})
+    response.raise_for_status()
+    return response.json()
+
 @api_router.get("/shows/search")
 async def search_shows(q: str, user: User = Depends(get_current_user)):
     """Search shows using TVMaze API"""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"https://api.tvmaze.com/search/shows?q={q}")
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"TVMaze API error: {str(e)}")
+    query = normalize_search_query(q)
+    if not query:
+        return []
+    
+    try:
+        results = await search_cache.get(query, fetch_tvmaze_search)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"TVMaze API error: {str(e)}")
+    # TVMaze's JSON goes back as-is
+    return MongoJSONResponse(results)
 
 @api_router.post("/shows/favorites")
 async def add_favorite_show(show_data: dict, user: User = Depends(get_current_user)):
@@ -792,15 +1986,13 @@ async def add_favorite_show(show_data: dict, user: User = Depends(get_current_us
     show_dict["added_at"] = show_dict["added_at"].isoformat()
     await db.shows.insert_one(show_dict)
     
-    # Fetch episodes from TVMaze and store them
-    await fetch_and_store_episodes(user.id, show.id, show_data["tvmaze_id"])
+    # Episodes are ingested into the shared catalog in the background
+    episodes_status = await request_episode_sync(show_data["tvmaze_id"])
     
-    return show
+    return {**show.model_dump(), "episodes_status": episodes_status}
 
-@api_router.get("/shows/favorites")
-async def get_favorite_shows(user: User = Depends(get_current_user)):
-    """Get user's favorite shows"""
-    shows = await db.shows.find({"user_id": user.id}, {"_id": 0}).to_list(1000)
+async def with_show_progress(user_id: str, shows: list) -> list:
+    progress_by_show = await get_progress_for_shows(user_id, shows)
     
     for show in shows:
         if isinstance(show.get("added_at"), str):
@@ -808,9 +2000,30 @@ async def get_favorite_shows(user: User = Depends(get_current_user)):
             # Ensure timezone-aware
             if show["added_at"].tzinfo is None:
                 show["added_at"] = show["added_at"].replace(tzinfo=timezone.utc)
-    
+        progress = progress_by_show.get(show["id"], {})
+        show["progress"] = {
+            "watched_count": progress.get("watched_count", 0),
+            "total_count": progress.get("total_count", 0),
+            "next_unwatched": progress.get("next_unwatched")
+        }
     return shows
 
+@api_router.get("/shows/favorites", response_model=List[FavoriteShow])
+async def get_favorite_shows(
+    stream: Optional[str] = Query(None, pattern=STREAM_MODE_PATTERN),
+    user: User = Depends(get_current_user)
+):
+    """Get user's favorite shows; `stream=ndjson|json` streams them as they are read"""
+    cursor = db.shows.find({"user_id": user.id}, {"_id": 0})
+    
+    if stream:
+        async def batches():
+            async for shows in iter_batches(cursor):
+                yield await with_show_progress(user.id, shows)
+        return stream_documents(batches(), stream)
+    
+    return MongoJSONResponse(await with_show_progress(user.id, await cursor.to_list(None)))
+
 @api_router.delete("/shows/favorites/{show_id}")
 async def remove_favorite_show(show_id: str, user: User = Depends(get_current_user)):
     """Remove show from favorites"""
@@ -818,8 +2031,9 @@ async def remove_favorite_show(show_id: str, user: User = Depends(get_current_us
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Show not found")
     
-    # Delete associated episodes
-    await db.episodes.delete_many({"show_id": show_id, "user_id": user.id})
+    # Delete the user's watch state; catalog episodes are shared and stay
+    await db.watched_episodes.delete_many({"show_id": show_id, "user_id": user.id})
+    await db.show_progress.delete_one({"show_id": show_id, "user_id": user.id})
     
     return {"message": "Show removed from favorites"}
 
@@ -842,147 +2056,1802 @@ async def rate_show(show_id: str, rating_data: dict, user: User = Depends(get_cu
 
 # ============= EPISODE ROUTES =============
 
-async def fetch_and_store_episodes(user_id: str, show_id: str, tvmaze_id: int):
-    """Fetch episodes from TVMaze and store in database"""
-    # Check if episodes already exist for this user and show
-    existing_count = await db.episodes.count_documents({
-        "user_id": user_id,
-        "show_id": show_id
-    })
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive datetimes as UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def parse_airstamp(airstamp: Optional[str]) -> Optional[datetime]:
+    """TVMaze airstamp (ISO 8601 with offset) as a UTC datetime"""
+    if not airstamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(airstamp)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def episode_from_tvmaze(tvmaze_show_id: int, ep_data: dict) -> Episode:
+    """Build a catalog episode from a TVMaze episode payload"""
+    return Episode(
+        # Deterministic id so every user (and every re-fetch) sees the same episode
+        id=str(ep_data["id"]),
+        tvmaze_show_id=tvmaze_show_id,
+        tvmaze_episode_id=ep_data["id"],
+        season=ep_data["season"],
+        number=ep_data["number"],
+        name=ep_data["name"],
+        airdate=ep_data.get("airdate"),
+        airstamp=ep_data.get("airstamp"),
+        runtime=ep_data.get("runtime"),
+        summary=ep_data.get("summary"),
+        airstamp_at=parse_airstamp(ep_data.get("airstamp"))
+    )
+
+def comparable(value):
+    """
+    Datetimes as naive UTC for diffing. The client is tz_aware, so Mongo returns
+    aware UTC values; naive ones (treated as UTC) still compare equal to them.
+    """
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Max operations per bulk_write when ingesting episodes
+EPISODE_BULK_CHUNK_SIZE = 500
+
+async def ingest_episodes(tvmaze_id: int, episodes_data: list) -> dict:
+    """
+    Validate a TVMaze episode list and diff-apply it to the catalog: new
+    episodes are inserted, changed ones get a $set of the changed fields, all
+    in chunked, unordered bulk writes keyed on tvmaze_episode_id.
+    Returns counts of inserted, updated, skipped (unchanged) and failed episodes.
+    """
+    report = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
     
-    if existing_count > 0:
-        # Episodes already fetched, skip
-        return
+    existing = {}
+    async for doc in db.episode_catalog.find({"tvmaze_show_id": tvmaze_id}, {"_id": 0}):
+        existing[doc["tvmaze_episode_id"]] = doc
     
-    async with httpx.AsyncClient() as client:
+    operations = []
+    # Episodes whose airstamp is new or changed, for the airstamp scheduler
+    airstamps = []
+    for ep_data in episodes_data:
         try:
-            response = await client.get(f"https://api.tvmaze.com/shows/{tvmaze_id}/episodes")
-            response.raise_for_status()
-            episodes_data = response.json()
-            
-            for ep_data in episodes_data:
-                episode = Episode(
-                    user_id=user_id,
-                    show_id=show_id,
-                    tvmaze_episode_id=ep_data["id"],
-                    season=ep_data["season"],
-                    number=ep_data["number"],
-                    name=ep_data["name"],
-                    airdate=ep_data.get("airdate"),
-                    airstamp=ep_data.get("airstamp"),
-                    runtime=ep_data.get("runtime"),
-                    summary=ep_data.get("summary"),
-                    watched=False
-                )
-                
-                ep_dict = episode.model_dump()
-                await db.episodes.insert_one(ep_dict)
-        except Exception as e:
-            logging.error(f"Failed to fetch episodes: {str(e)}")
+            episode = episode_from_tvmaze(tvmaze_id, ep_data)
+        except (ValidationError, KeyError, TypeError) as e:
+            logging.warning(f"Skipping invalid TVMaze episode for show {tvmaze_id}: {e}")
+            report["failed"] += 1
+            continue
+        
+        episode_dict = episode.model_dump()
+        current = existing.get(episode.tvmaze_episode_id)
+        if current is None:
+            operations.append(UpdateOne(
+                {"tvmaze_episode_id": episode.tvmaze_episode_id},
+                {"$setOnInsert": episode_dict},
+                upsert=True
+            ))
+            airstamps.append((episode.id, episode.airstamp_at))
+            continue
+        
+        changes = {
+            field: value for field, value in episode_dict.items()
+            if comparable(current.get(field)) != comparable(value)
+        }
+        if not changes:
+            report["skipped"] += 1
+            continue
+        operations.append(UpdateOne(
+            {"tvmaze_episode_id": episode.tvmaze_episode_id},
+            {"$set": changes}
+        ))
+        if "airstamp_at" in changes:
+            airstamps.append((episode.id, episode.airstamp_at))
+    
+    for i in range(0, len(operations), EPISODE_BULK_CHUNK_SIZE):
+        chunk = operations[i:i + EPISODE_BULK_CHUNK_SIZE]
+        try:
+            result = await db.episode_catalog.bulk_write(chunk, ordered=False)
+            inserted = result.upserted_count
+            updated = result.modified_count
+            failed = 0
+        except BulkWriteError as e:
+            # Unordered writes keep going past errors; count what landed
+            inserted = e.details.get("nUpserted", 0)
+            updated = e.details.get("nModified", 0)
+            failed = len(e.details.get("writeErrors", []))
+            logging.error(f"Bulk episode write for show {tvmaze_id} had {failed} errors")
+        report["inserted"] += inserted
+        report["updated"] += updated
+        report["failed"] += failed
+        report["skipped"] += len(chunk) - inserted - updated - failed
+    
+    for episode_id, airstamp_at in airstamps:
+        airstamp_scheduler.schedule(episode_id, airstamp_at)
+    
+    if report["inserted"] or report["updated"]:
+        await mark_progress_stale({"tvmaze_id": tvmaze_id})
+    
+    return report
 
-@api_router.get("/shows/{show_id}/episodes")
-async def get_show_episodes(show_id: str, user: User = Depends(get_current_user)):
-    """Get episodes for a show"""
-    episodes = await db.episodes.find(
-        {"show_id": show_id, "user_id": user.id},
-        {"_id": 0}
-    ).to_list(1000)
+async def fetch_and_store_episodes(tvmaze_id: int) -> Optional[dict]:
+    """
+    Fetch episodes from TVMaze and store them in the shared episode catalog.
+    Returns the ingestion report, or None if the catalog already had the show.
+    TVMaze and database errors propagate to the caller.
+    """
+    # Check if the show's episodes are already in the catalog
+    existing_count = await db.episode_catalog.count_documents({"tvmaze_show_id": tvmaze_id}, limit=1)
     
-    for episode in episodes:
-        if isinstance(episode.get("watched_at"), str):
-            episode["watched_at"] = datetime.fromisoformat(episode["watched_at"])
-            # Ensure timezone-aware
-            if episode["watched_at"].tzinfo is None:
-                episode["watched_at"] = episode["watched_at"].replace(tzinfo=timezone.utc)
+    if existing_count > 0:
+        # Episodes already fetched (possibly by another user), skip
+        return None
+    
+    response = await tvmaze_get(f"/shows/{tvmaze_id}/episodes", priority=PRIORITY_BACKGROUND)
+    response.raise_for_status()
+    episodes_data = response.json()
     
-    return episodes
+    report = await ingest_episodes(tvmaze_id, episodes_data)
+    logging.info(f"Ingested episodes for show {tvmaze_id}: {report}")
+    return report
+
+# ============= EPISODE SYNC QUEUE =============
+# Episode ingestion runs off the request path. Per-show sync status lives in
+# db.show_catalog so every worker process (and the app) can read it.
+
+EPISODE_SYNC_WORKERS = int(os.environ.get("EPISODE_SYNC_WORKERS", "4"))
+EPISODE_SYNC_QUEUE_SIZE = int(os.environ.get("EPISODE_SYNC_QUEUE_SIZE", "1000"))
+# Syncs that fail because TVMaze is rate limiting us are retried this many times
+EPISODE_SYNC_MAX_ATTEMPTS = int(os.environ.get("EPISODE_SYNC_MAX_ATTEMPTS", "5"))
+EPISODE_SYNC_STALE_SECONDS = 60
+EPISODE_SYNC_RESUME_INTERVAL_SECONDS = 300
 
-@api_router.get("/episodes/upcoming")
-async def get_upcoming_episodes(user: User = Depends(get_current_user)):
-    """Get upcoming episodes from user's favorite shows"""
-    today = datetime.now(timezone.utc).date().isoformat()
+async def set_sync_status(tvmaze_id: int, status: str, **fields):
+    """Record a show's episode sync status in the show catalog"""
+    await db.show_catalog.update_one(
+        {"tvmaze_id": tvmaze_id},
+        {"$set": {"episodes_status": status, "status_updated_at": datetime.now(timezone.utc).isoformat(), **fields}},
+        upsert=True
+    )
+
+class EpisodeSyncQueue:
+    """
+    Bounded asyncio work queue with a fixed pool of ingestion workers.
+    Jobs are keyed on tvmaze_id: a show that is already queued or being
+    synced is not queued again, so many users adding it at once cost one fetch.
+    """
     
-    episodes = await db.episodes.find(
+    def __init__(self, workers: int, maxsize: int):
+        self.worker_count = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._in_flight: set = set()
+        self._workers: List[asyncio.Task] = []
+        self._retries: set = set()
+        self.overflows = 0
+        self.errors = 0
+    
+    def start(self):
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.worker_count)]
+    
+    async def stop(self):
+        tasks = self._workers + list(self._retries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+    
+    def is_in_flight(self, tvmaze_id: int) -> bool:
+        return tvmaze_id in self._in_flight
+    
+    async def enqueue(self, tvmaze_id: int, attempt: int = 1, wait: bool = False) -> bool:
+        """
+        Queue a sync for the show. Returns False if one was already in flight.
+        Raises asyncio.QueueFull when the queue is full, unless `wait` is set.
+        """
+        if tvmaze_id in self._in_flight:
+            return False
+        self._in_flight.add(tvmaze_id)
+        try:
+            await set_sync_status(tvmaze_id, "pending")
+            if wait:
+                await self._queue.put((tvmaze_id, attempt))
+            else:
+                self._queue.put_nowait((tvmaze_id, attempt))
+        except asyncio.QueueFull:
+            self._in_flight.discard(tvmaze_id)
+            self.overflows += 1
+            raise
+        except BaseException:
+            self._in_flight.discard(tvmaze_id)
+            raise
+        return True
+    
+    async def _run(self):
+        while True:
+            tvmaze_id, attempt = await self._queue.get()
+            retry_scheduled = False
+            try:
+                retry_scheduled = await self._sync(tvmaze_id, attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Usually Mongo failing while recording the outcome; keep the worker alive
+                self.errors += 1
+                logging.error(f"Episode sync worker failed on show {tvmaze_id}: {e}")
+            finally:
+                if not retry_scheduled:
+                    self._in_flight.discard(tvmaze_id)
+                self._queue.task_done()
+    
+    def _schedule_retry(self, tvmaze_id: int, attempt: int, delay: float):
+        # The show stays in flight while waiting, so new requests coalesce into the retry
+        async def retry():
+            await asyncio.sleep(delay)
+            await self._queue.put((tvmaze_id, attempt))
+        
+        task = asyncio.create_task(retry())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+    
+    async def _sync(self, tvmaze_id: int, attempt: int) -> bool:
+        """Run one sync attempt; returns True if a retry was scheduled"""
+        try:
+            await set_sync_status(tvmaze_id, "syncing")
+            await fetch_and_store_episodes(tvmaze_id)
+            episode_count = await db.episode_catalog.count_documents({"tvmaze_show_id": tvmaze_id})
+            await set_sync_status(
+                tvmaze_id, "ready",
+                episode_count=episode_count,
+                synced_at=datetime.now(timezone.utc).isoformat(),
+                # Any TVMaze update up to now is already in what we fetched
+                tvmaze_updated=int(time.time()),
+                error=None
+            )
+        except asyncio.CancelledError:
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429 and attempt < EPISODE_SYNC_MAX_ATTEMPTS:
+                # Still rate limited after tvmaze_get's own retries; try again later
+                delay = retry_after_seconds(e.response, default=30 * attempt)
+                logging.warning(f"Episode sync for show {tvmaze_id} rate limited; retry {attempt + 1} in {delay:.0f}s")
+                await set_sync_status(tvmaze_id, "pending", error="Rate limited by TVMaze, retrying")
+                self._schedule_retry(tvmaze_id, attempt + 1, delay)
+                return True
+            logging.error(f"Failed to sync episodes for show {tvmaze_id}: {e}")
+            await set_sync_status(tvmaze_id, "failed", error=str(e))
+        except Exception as e:
+            logging.error(f"Failed to sync episodes for show {tvmaze_id}: {e}")
+            await set_sync_status(tvmaze_id, "failed", error=str(e))
+        return False
+    
+    def metrics(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "in_flight": len(self._in_flight),
+            "overflows": self.overflows,
+            "errors": self.errors
+        }
+
+episode_sync_queue = EpisodeSyncQueue(EPISODE_SYNC_WORKERS, EPISODE_SYNC_QUEUE_SIZE)
+
+async def request_episode_sync(tvmaze_id: int) -> str:
+    """Queue ingestion for a show unless its catalog is already populated; returns episodes_status"""
+    if episode_sync_queue.is_in_flight(tvmaze_id):
+        return "pending"
+    if await db.episode_catalog.count_documents({"tvmaze_show_id": tvmaze_id}, limit=1):
+        return "ready"
+    try:
+        await episode_sync_queue.enqueue(tvmaze_id)
+    except asyncio.QueueFull:
+        # Recorded as pending; pending_sync_job queues it once there is room
+        logging.warning(f"Episode sync queue full; show {tvmaze_id} left pending")
+    except Exception as e:
+        logging.error(f"Failed to queue episode sync for show {tvmaze_id}: {e}")
+        return "failed"
+    return "pending"
+
+async def resume_pending_syncs():
+    """
+    Queue syncs left pending or running by a stopped process, an overflowing
+    queue or the catalog migration. Shows whose status changed in the last
+    minute are probably being handled by another worker and are skipped.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=EPISODE_SYNC_STALE_SECONDS)).isoformat()
+    cursor = db.show_catalog.find(
         {
-            "user_id": user.id,
-            "airdate": {"$gte": today},
-            "watched": False
+            "episodes_status": {"$in": ["pending", "syncing"]},
+            "$or": [{"status_updated_at": {"$lt": cutoff}}, {"status_updated_at": {"$exists": False}}]
         },
-        {"_id": 0}
-    ).sort("airdate", 1).to_list(100)
+        {"_id": 0, "tvmaze_id": 1}
+    )
+    async for doc in cursor:
+        # Waits for room in the queue rather than dropping the show again
+        await episode_sync_queue.enqueue(doc["tvmaze_id"], wait=True)
+
+# ============= BACKGROUND JOBS =============
+
+class PeriodicJob:
+    """Runs an async function every `interval` seconds until stopped; errors are logged, not fatal"""
+    
+    def __init__(self, name: str, interval: float, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _loop(self):
+        while True:
+            try:
+                await self.func()
+                self.runs += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Background job {self.name} failed: {e}")
+            self.last_run_at = datetime.now(timezone.utc).isoformat()
+            await asyncio.sleep(self.interval)
+    
+    def metrics(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at
+        }
+
+class LeaderLease:
+    """
+    Leader election across workers and replicas through a lease document in
+    db.leases, keyed on _id. Every worker tries to take or renew the lease each ttl/3
+    seconds; the holder runs on_elected when it wins and on_deposed when it
+    loses the lease or shuts down. A leader that can't reach Mongo steps down
+    once its lease would have expired, by which time another worker can win.
+    """
+    
+    def __init__(self, name: str, ttl: float, on_elected, on_deposed):
+        self.name = name
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.holder: Optional[str] = None
+        self.is_leader = False
+        self.elections = 0
+        self._valid_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        # Decided per process, so workers forked from one parent still differ
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            await self._step_down()
+            try:
+                # Hand over right away instead of making the others wait out the ttl
+                await db.leases.delete_one({"_id": self.name, "holder": self.holder})
+            except Exception as e:
+                logging.error(f"Failed to release lease {self.name}: {e}")
+    
+    async def _try_acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.leases.update_one(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {
+                    "holder": self.holder,
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                    "renewed_at": now
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Held by another worker, so the upsert collided with its _id
+            return False
+        self._valid_until = time.monotonic() + self.ttl
+        return True
+    
+    async def _step_down(self):
+        self.is_leader = False
+        logging.info(f"{self.holder} gave up lease {self.name}")
+        try:
+            await self.on_deposed()
+        except Exception as e:
+            logging.error(f"Failed to stop {self.name} work: {e}")
+    
+    async def _run(self):
+        while True:
+            try:
+                acquired = await self._try_acquire()
+            except Exception as e:
+                logging.error(f"Failed to renew lease {self.name}: {e}")
+                acquired = self.is_leader and time.monotonic() < self._valid_until
+            
+            if acquired and not self.is_leader:
+                self.is_leader = True
+                self.elections += 1
+                logging.info(f"{self.holder} holds lease {self.name}")
+                try:
+                    await self.on_elected()
+                except Exception as e:
+                    logging.error(f"Failed to start {self.name} work: {e}")
+            elif not acquired and self.is_leader:
+                await self._step_down()
+            await asyncio.sleep(self.ttl / 3)
+    
+    def metrics(self) -> dict:
+        return {
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "elections": self.elections,
+            "ttl_seconds": self.ttl
+        }
+
+# ============= EPISODE REFRESH =============
+# TVMaze's /updates/shows lists the last-update timestamp of every show that
+# changed in a window. Each followed show keeps a watermark (tvmaze_updated in
+# db.show_catalog); only shows whose timestamp moved past it are refetched.
+
+EPISODE_REFRESH_INTERVAL_SECONDS = float(os.environ.get("EPISODE_REFRESH_INTERVAL_SECONDS", "3600"))
+
+def tvmaze_updates_window(last_run_at: Optional[datetime]) -> str:
+    """Smallest /updates/shows window that covers everything since our last run"""
+    if last_run_at is not None:
+        elapsed = datetime.now(timezone.utc) - last_run_at
+        if elapsed < timedelta(hours=23):
+            return "day"
+        if elapsed < timedelta(days=6, hours=23):
+            return "week"
+    return "month"
+
+async def refresh_show_episodes(tvmaze_id: int, tvmaze_updated: int) -> dict:
+    """Refetch a show's episodes, diff-apply them and advance its watermark"""
+    response = await tvmaze_get(f"/shows/{tvmaze_id}/episodes", priority=PRIORITY_BACKGROUND)
+    response.raise_for_status()
+    report = await ingest_episodes(tvmaze_id, response.json())
+    
+    episode_count = await db.episode_catalog.count_documents({"tvmaze_show_id": tvmaze_id})
+    await db.show_catalog.update_one(
+        {"tvmaze_id": tvmaze_id},
+        {"$set": {
+            "episodes_status": "ready",
+            "episode_count": episode_count,
+            "tvmaze_updated": tvmaze_updated,
+            "synced_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+    return report
+
+async def refresh_updated_shows():
+    """Refetch episodes for followed shows that TVMaze reports as updated since their watermark"""
+    state = await db.scheduler_state.find_one({"id": "episode_refresh"}, {"_id": 0})
+    last_run_at = datetime.fromisoformat(state["last_run_at"]) if state else None
+    started_at = datetime.now(timezone.utc)
+    if last_run_at and (started_at - last_run_at).total_seconds() < EPISODE_REFRESH_INTERVAL_SECONDS * 0.9:
+        # A restart shouldn't trigger an extra run
+        return
+    
+    response = await tvmaze_get(
+        "/updates/shows",
+        priority=PRIORITY_BACKGROUND,
+        params={"since": tvmaze_updates_window(last_run_at)}
+    )
+    response.raise_for_status()
+    updates = {int(tvmaze_id): updated for tvmaze_id, updated in response.json().items()}
+    
+    # Only shows someone still follows are worth refetching
+    followed = set(await db.shows.distinct("tvmaze_id", {"tvmaze_id": {"$in": list(updates)}}))
+    watermarks = {}
+    async for doc in db.show_catalog.find(
+        {"tvmaze_id": {"$in": list(followed)}},
+        {"_id": 0, "tvmaze_id": 1, "tvmaze_updated": 1}
+    ):
+        watermarks[doc["tvmaze_id"]] = doc.get("tvmaze_updated") or 0
+    
+    refreshed = 0
+    for tvmaze_id in followed:
+        if updates[tvmaze_id] <= watermarks.get(tvmaze_id, 0):
+            continue
+        try:
+            report = await refresh_show_episodes(tvmaze_id, updates[tvmaze_id])
+            refreshed += 1
+            logging.info(f"Refreshed episodes for show {tvmaze_id}: {report}")
+        except Exception as e:
+            # Watermark stays put, so the next run retries this show
+            logging.error(f"Failed to refresh episodes for show {tvmaze_id}: {e}")
     
-    # Enrich with show data
+    await db.scheduler_state.update_one(
+        {"id": "episode_refresh"},
+        {"$set": {"last_run_at": started_at.isoformat(), "shows_refreshed": refreshed}},
+        upsert=True
+    )
+
+episode_refresh_job = PeriodicJob("episode_refresh", EPISODE_REFRESH_INTERVAL_SECONDS, refresh_updated_shows)
+
+def merge_watch_state(episode: dict, show_id: str, user_id: str, watched: dict) -> dict:
+    """Join a catalog episode with the user's watch state into the API episode shape"""
+    watched_at = watched.get(episode["id"])
+    if isinstance(watched_at, str):
+        # Written before watched_at was stored as a BSON date
+        watched_at = as_utc(datetime.fromisoformat(watched_at))
+    
+    episode["user_id"] = user_id
+    episode["show_id"] = show_id
+    episode["watched"] = episode["id"] in watched
+    episode["watched_at"] = watched_at
+    return episode
+
+async def get_watched_map(user_id: str, query: dict) -> dict:
+    """Map episode_id -> watched_at for the user's watched episodes matching query"""
+    docs = await db.watched_episodes.find(
+        {"user_id": user_id, **query},
+        {"_id": 0, "episode_id": 1, "watched_at": 1}
+    ).to_list(None)
+    return {doc["episode_id"]: doc.get("watched_at") for doc in docs}
+
+# Fields added to catalog episodes when joining the user's watch state
+WATCH_STATE_FIELDS = ("user_id", "show_id", "watched", "watched_at")
+EPISODE_LIST_FIELDS = set(Episode.model_fields) | set(WATCH_STATE_FIELDS)
+# What the episode list view needs
+COMPACT_EPISODE_FIELDS = ("id", "season", "number", "name", "airdate", "watched")
+
+@api_router.get(
+    "/shows/{show_id}/episodes",
+    response_model=Union[List[EpisodeWithWatchState], List[SeasonEpisodes]]
+)
+async def get_show_episodes(
+    show_id: str,
+    fields: Optional[str] = None,
+    compact: bool = False,
+    season: Optional[int] = None,
+    group_by_season: bool = False,
+    stream: Optional[str] = Query(None, pattern=STREAM_MODE_PATTERN),
+    user: User = Depends(get_current_user)
+):
+    """
+    Get episodes for a show. `fields` (comma-separated) or `compact` limit the
+    returned fields, projected in the database; `season` filters to one season;
+    `group_by_season` returns [{"season": n, "episodes": [...]}]; `stream=ndjson|json`
+    streams episodes as they are read.
+    """
+    if stream and group_by_season:
+        raise HTTPException(status_code=400, detail="group_by_season can't be streamed")
+    
+    selected = None
+    if compact:
+        selected = set(COMPACT_EPISODE_FIELDS)
+    elif fields:
+        selected = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = selected - EPISODE_LIST_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown episode fields: {', '.join(sorted(unknown))}")
+        selected.add("id")
+    if selected is not None and group_by_season:
+        selected.add("season")
+    
+    show = await db.shows.find_one({"id": show_id, "user_id": user.id}, {"_id": 0, "tvmaze_id": 1})
+    if not show:
+        return []
+    
+    projection = {"_id": 0}
+    if selected is not None:
+        projection.update({field: 1 for field in selected if field not in WATCH_STATE_FIELDS})
+    query = {"tvmaze_show_id": show["tvmaze_id"]}
+    if season is not None:
+        query["season"] = season
+    
+    if season is None and not await db.episode_catalog.count_documents(query, limit=1):
+        # Earlier ingestion failed or predates the catalog; sync in the background
+        await request_episode_sync(show["tvmaze_id"])
+        return []
+    
+    watched = await get_watched_map(user.id, {"show_id": show_id})
+    cursor = db.episode_catalog.find(query, projection).sort([("season", 1), ("number", 1)])
+    
+    def shape(episodes: list) -> list:
+        episodes = [merge_watch_state(episode, show_id, user.id, watched) for episode in episodes]
+        if selected is not None:
+            for episode in episodes:
+                for field in WATCH_STATE_FIELDS:
+                    if field not in selected:
+                        del episode[field]
+        return episodes
+    
+    if stream:
+        async def batches():
+            async for episodes in iter_batches(cursor):
+                yield shape(episodes)
+        return stream_documents(batches(), stream)
+    
+    episodes = shape(await cursor.to_list(None))
+    if not group_by_season:
+        return MongoJSONResponse(episodes)
+    
+    seasons = {}
     for episode in episodes:
-        show = await db.shows.find_one({"id": episode["show_id"]}, {"_id": 0})
-        if show:
+        seasons.setdefault(episode["season"], []).append(episode)
+    return MongoJSONResponse([{"season": number, "episodes": season_episodes} for number, season_episodes in seasons.items()])
+
+@api_router.get("/shows/{show_id}/sync-status")
+async def get_show_sync_status(show_id: str, user: User = Depends(get_current_user)):
+    """Get the episode ingestion status for a favorite show"""
+    show = await db.shows.find_one({"id": show_id, "user_id": user.id}, {"_id": 0, "tvmaze_id": 1})
+    if not show:
+        raise HTTPException(status_code=404, detail="Show not found")
+    
+    state = await db.show_catalog.find_one({"tvmaze_id": show["tvmaze_id"]}, {"_id": 0})
+    if not state:
+        # Show added before sync tracking existed
+        episodes_status = await request_episode_sync(show["tvmaze_id"])
+        state = {"tvmaze_id": show["tvmaze_id"], "episodes_status": episodes_status}
+    
+    return {
+        "show_id": show_id,
+        "tvmaze_id": state["tvmaze_id"],
+        "episodes_status": state["episodes_status"],
+        "episode_count": state.get("episode_count"),
+        "synced_at": state.get("synced_at"),
+        "error": state.get("error")
+    }
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+@api_router.get("/episodes/upcoming", response_model=List[UpcomingEpisode])
+async def get_upcoming_episodes(
+    days: Optional[int] = Query(None, ge=1, le=365),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user)
+):
+    """
+    Get upcoming episodes from user's favorite shows, ordered by airdate.
+    `days` limits the window from today; when more episodes remain, the
+    X-Next-Cursor response header holds the cursor for the next page.
+    """
+    today = datetime.now(timezone.utc).date()
+    
+    shows = await db.shows.find(
+        {"user_id": user.id},
+        {"_id": 0, "id": 1, "tvmaze_id": 1, "name": 1, "image_url": 1}
+    ).to_list(None)
+    shows_by_tvmaze_id = {show["tvmaze_id"]: show for show in shows}
+    if not shows_by_tvmaze_id:
+        return []
+    
+    airdate_range = {"$gte": today.isoformat()}
+    if days is not None:
+        airdate_range["$lt"] = (today + timedelta(days=days)).isoformat()
+    query = {
+        "tvmaze_show_id": {"$in": list(shows_by_tvmaze_id)},
+        "airdate": airdate_range
+    }
+    if cursor:
+        after_airdate, after_id = decode_cursor(cursor, 2)
+        query["$or"] = [
+            {"airdate": {"$gt": after_airdate}},
+            {"airdate": after_airdate, "id": {"$gt": after_id}}
+        ]
+    
+    catalog_cursor = db.episode_catalog.find(query, {"_id": 0}).sort([("airdate", 1), ("id", 1)])
+    
+    # One extra episode tells us whether there is a next page
+    episodes = []
+    while len(episodes) <= limit:
+        batch = await catalog_cursor.to_list(limit + 1)
+        if not batch:
+            break
+        # Upcoming episodes are rarely watched, so look up watch state per batch
+        watched = await get_watched_map(user.id, {"episode_id": {"$in": [ep["id"] for ep in batch]}})
+        for episode in batch:
+            if episode["id"] in watched:
+                continue
+            show = shows_by_tvmaze_id[episode["tvmaze_show_id"]]
+            merge_watch_state(episode, show["id"], user.id, watched)
+            # Enrich with show data
             episode["show_name"] = show["name"]
             episode["show_image"] = show.get("image_url")
+            episodes.append(episode)
+    
+    headers = {}
+    if len(episodes) > limit:
+        episodes = episodes[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(episodes[-1]["airdate"], episodes[-1]["id"])
     
-    return episodes
+    return MongoJSONResponse(episodes, headers=headers)
 
 @api_router.put("/episodes/{episode_id}/watched")
 async def mark_episode_watched(episode_id: str, watched_data: dict, user: User = Depends(get_current_user)):
     """Mark episode as watched/unwatched"""
     watched = watched_data.get("watched", True)
     
-    update_data = {"watched": watched}
+    episode = await db.episode_catalog.find_one(
+        {"id": episode_id},
+        {"_id": 0, "id": 1, "tvmaze_show_id": 1, "season": 1, "number": 1}
+    )
+    show = None
+    if episode:
+        show = await db.shows.find_one(
+            {"user_id": user.id, "tvmaze_id": episode["tvmaze_show_id"]},
+            {"_id": 0, "id": 1}
+        )
+    if not show:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    
     if watched:
-        update_data["watched_at"] = datetime.now(timezone.utc).isoformat()
+        watch = WatchedEpisode(user_id=user.id, show_id=show["id"], episode_id=episode_id)
+        watch_dict = watch.model_dump()
+        result = await db.watched_episodes.update_one(
+            {"user_id": user.id, "episode_id": episode_id},
+            {"$set": watch_dict},
+            upsert=True
+        )
+        changed = result.upserted_id is not None
+    else:
+        result = await db.watched_episodes.delete_one({"user_id": user.id, "episode_id": episode_id})
+        changed = result.deleted_count > 0
+    
+    if changed:
+        await record_watch_change(user.id, show["id"], episode, watched)
+    
+    return {"message": "Episode updated"}
+
+class EpisodeNumber(BaseModel):
+    season: int
+    number: int
+
+class BatchWatchedRequest(BaseModel):
+    """
+    Episodes to mark, either by id or as a range of one show: a whole
+    `season`, or everything up to and including `up_to` (e.g. S03E05).
+    """
+    watched: bool = True
+    episode_ids: Optional[List[str]] = Field(None, max_length=2000)
+    show_id: Optional[str] = None
+    season: Optional[int] = None
+    up_to: Optional[EpisodeNumber] = None
+
+@api_router.put("/episodes/watched")
+async def mark_episodes_watched(batch: BatchWatchedRequest, user: User = Depends(get_current_user)):
+    """Mark many episodes as watched/unwatched in one request, with a result per episode"""
+    # episode_id -> the user's show id
+    targets = {}
+    
+    if batch.episode_ids is not None:
+        if batch.show_id is not None:
+            raise HTTPException(status_code=400, detail="Give either episode_ids or show_id, not both")
+        if batch.season is not None or batch.up_to is not None:
+            raise HTTPException(status_code=400, detail="season and up_to apply to show_id, not episode_ids")
+        episode_ids = list(dict.fromkeys(batch.episode_ids))
+        episodes = await db.episode_catalog.find(
+            {"id": {"$in": episode_ids}},
+            {"_id": 0, "id": 1, "tvmaze_show_id": 1}
+        ).to_list(None)
+        shows = await db.shows.find(
+            {"user_id": user.id, "tvmaze_id": {"$in": list({ep["tvmaze_show_id"] for ep in episodes})}},
+            {"_id": 0, "id": 1, "tvmaze_id": 1}
+        ).to_list(None)
+        show_ids = {show["tvmaze_id"]: show["id"] for show in shows}
+        for episode in episodes:
+            if episode["tvmaze_show_id"] in show_ids:
+                targets[episode["id"]] = show_ids[episode["tvmaze_show_id"]]
+    elif batch.show_id is not None:
+        show = await db.shows.find_one({"id": batch.show_id, "user_id": user.id}, {"_id": 0, "tvmaze_id": 1})
+        if not show:
+            raise HTTPException(status_code=404, detail="Show not found")
+        query = {"tvmaze_show_id": show["tvmaze_id"]}
+        if batch.season is not None:
+            query["season"] = batch.season
+        if batch.up_to is not None:
+            query["$or"] = [
+                {"season": {"$lt": batch.up_to.season}},
+                {"season": batch.up_to.season, "number": {"$lte": batch.up_to.number}}
+            ]
+        async for episode in db.episode_catalog.find(query, {"_id": 0, "id": 1}).sort([("season", 1), ("number", 1)]):
+            targets[episode["id"]] = batch.show_id
+        episode_ids = list(targets)
+    else:
+        raise HTTPException(status_code=400, detail="episode_ids or show_id required")
+    
+    already_watched = set(await get_watched_map(user.id, {"episode_id": {"$in": list(targets)}}))
+    if batch.watched:
+        changed = [episode_id for episode_id in targets if episode_id not in already_watched]
+        watched_at = datetime.now(timezone.utc)
+        if changed:
+            await db.watched_episodes.bulk_write([
+                UpdateOne(
+                    {"user_id": user.id, "episode_id": episode_id},
+                    {"$setOnInsert": {
+                        "user_id": user.id,
+                        "show_id": targets[episode_id],
+                        "episode_id": episode_id,
+                        "watched_at": watched_at
+                    }},
+                    upsert=True
+                )
+                for episode_id in changed
+            ], ordered=False)
     else:
-        update_data["watched_at"] = None
+        changed = [episode_id for episode_id in targets if episode_id in already_watched]
+        if changed:
+            await db.watched_episodes.delete_many({"user_id": user.id, "episode_id": {"$in": changed}})
+    
+    if changed:
+        await mark_progress_stale({"user_id": user.id, "show_id": {"$in": list({targets[ep_id] for ep_id in changed})}})
+    
+    changed = set(changed)
+    results = []
+    for episode_id in episode_ids:
+        if episode_id not in targets:
+            status = "not_found"
+        elif episode_id in changed:
+            status = "updated"
+        else:
+            status = "unchanged"
+        results.append({"episode_id": episode_id, "status": status})
+    
+    statuses = [result["status"] for result in results]
+    return {
+        "updated": statuses.count("updated"),
+        "unchanged": statuses.count("unchanged"),
+        "not_found": statuses.count("not_found"),
+        "results": results
+    }
+
+async def record_migration(migration_id: str):
+    """Mark a migration as applied; an upsert, so a leader handover mid-run can't fail it"""
+    await db.migrations.update_one(
+        {"id": migration_id},
+        {"$setOnInsert": {"id": migration_id, "applied_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+
+async def migrate_legacy_episodes():
+    """
+    Move watch state out of the legacy per-user `episodes` collection and
+    queue catalog ingestion for every followed show, so upcoming episodes,
+    progress and notifications work before anyone opens a show. Runs once;
+    the legacy collection is left in place.
+    """
+    if await db.migrations.find_one({"id": "episode_catalog"}):
+        return
     
-    result = await db.episodes.update_one(
-        {"id": episode_id, "user_id": user.id},
-        {"$set": update_data}
+    migrated = 0
+    operations = []
+    cursor = db.episodes.find(
+        {"watched": True},
+        {"_id": 0, "user_id": 1, "show_id": 1, "tvmaze_episode_id": 1, "watched_at": 1}
     )
+    async for legacy in cursor:
+        episode_id = str(legacy["tvmaze_episode_id"])
+        operations.append(UpdateOne(
+            {"user_id": legacy["user_id"], "episode_id": episode_id},
+            {"$setOnInsert": {
+                "user_id": legacy["user_id"],
+                "show_id": legacy["show_id"],
+                "episode_id": episode_id,
+                "watched_at": legacy.get("watched_at") or datetime.now(timezone.utc)
+            }},
+            upsert=True
+        ))
+        if len(operations) >= EPISODE_BULK_CHUNK_SIZE:
+            await db.watched_episodes.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+            operations = []
+    if operations:
+        await db.watched_episodes.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+    
+    # Shows without a catalog entry become pending; the leader's resume_pending_syncs() ingests them
+    operations = [
+        UpdateOne(
+            {"tvmaze_id": tvmaze_id},
+            {"$setOnInsert": {"tvmaze_id": tvmaze_id, "episodes_status": "pending"}},
+            upsert=True
+        )
+        for tvmaze_id in await db.shows.distinct("tvmaze_id")
+    ]
+    for start in range(0, len(operations), EPISODE_BULK_CHUNK_SIZE):
+        await db.show_catalog.bulk_write(operations[start:start + EPISODE_BULK_CHUNK_SIZE], ordered=False)
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Episode not found")
+    await record_migration("episode_catalog")
+    logging.info(f"Migrated {migrated} watched episodes to the shared episode catalog; queued {len(operations)} shows for ingestion")
+
+async def convert_watched_at_to_dates():
+    """Store watched_at as a BSON date where older writes left an ISO string. Runs once."""
+    if await db.migrations.find_one({"id": "watched_at_dates"}):
+        return
     
-    return {"message": "Episode updated"}
+    # One server-side update instead of a read-modify-write per document
+    result = await db.watched_episodes.update_many(
+        {"watched_at": {"$type": "string"}},
+        [{"$set": {"watched_at": {"$dateFromString": {"dateString": "$watched_at"}}}}]
+    )
+    await record_migration("watched_at_dates")
+    logging.info(f"Converted watched_at to a date on {result.modified_count} watched episodes")
+
+async def backfill_episode_airstamps():
+    """Add airstamp_at to catalog episodes ingested before it existed. Runs once."""
+    if await db.migrations.find_one({"id": "episode_airstamp_at"}):
+        return
+    
+    operations = []
+    cursor = db.episode_catalog.find(
+        {"airstamp_at": {"$exists": False}, "airstamp": {"$type": "string"}},
+        {"_id": 0, "tvmaze_episode_id": 1, "airstamp": 1}
+    )
+    async for episode in cursor:
+        operations.append(UpdateOne(
+            {"tvmaze_episode_id": episode["tvmaze_episode_id"]},
+            {"$set": {"airstamp_at": parse_airstamp(episode["airstamp"])}}
+        ))
+        if len(operations) >= EPISODE_BULK_CHUNK_SIZE:
+            await db.episode_catalog.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.episode_catalog.bulk_write(operations, ordered=False)
+    
+    await record_migration("episode_airstamp_at")
+
+async def seed_unread_counters():
+    """
+    Create the unread counter of every user who has notifications. Runs once,
+    before notification jobs start, so the $inc upserts in
+    increment_unread_counts() never create a counter for a user who already
+    has unread notifications.
+    """
+    if await db.migrations.find_one({"id": "notification_counters"}):
+        return
+    
+    seeded = 0
+    operations = []
+    cursor = db.notifications.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": "$user_id", "unread": {"$sum": 1}}}
+    ])
+    async for group in cursor:
+        # Counters that already exist were kept exact by the writes; leave them
+        operations.append(UpdateOne(
+            {"user_id": group["_id"]},
+            {"$setOnInsert": {"user_id": group["_id"], "unread": group["unread"]}},
+            upsert=True
+        ))
+        if len(operations) >= EPISODE_BULK_CHUNK_SIZE:
+            await db.notification_counters.bulk_write(operations, ordered=False)
+            seeded += len(operations)
+            operations = []
+    if operations:
+        await db.notification_counters.bulk_write(operations, ordered=False)
+        seeded += len(operations)
+    
+    await record_migration("notification_counters")
+    logging.info(f"Seeded unread notification counters for {seeded} users")
+
+# ============= NOTIFICATION STREAM =============
+# In-process pub/sub behind GET /api/notifications/stream. Each connection
+# gets a small bounded queue; a client that falls that far behind is
+# disconnected and resumes from its Last-Event-ID on reconnect. Notifications
+# created in another worker reach this one's streams through the relay job.
+
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "20"))
+SSE_QUEUE_SIZE = int(os.environ.get("SSE_QUEUE_SIZE", "32"))
+SSE_MAX_CONNECTIONS_PER_USER = int(os.environ.get("SSE_MAX_CONNECTIONS_PER_USER", "5"))
+# Most notifications replayed to a reconnecting client
+SSE_RESUME_LIMIT = 100
+SSE_RELAY_SECONDS = float(os.environ.get("SSE_RELAY_SECONDS", "5"))
+# How far back the relay looks; covers notifications committed a little after their created_at
+SSE_RELAY_WINDOW = timedelta(seconds=30)
+
+def format_sse(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+def notification_event(notification: dict) -> str:
+    # The event id doubles as a (created_at, id) keyset cursor for resuming
+    event_id = encode_cursor(notification["created_at"], notification["id"])
+    return format_sse("notification", notification, event_id)
+
+class NotificationSubscriber:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.overflowed = False
+
+class NotificationBroker:
+    """Fans formatted SSE events out to the open streams of each user"""
+    
+    def __init__(self):
+        self._subscribers: dict = {}
+        # Ids of notifications already pushed, so the relay doesn't repeat them
+        self._recent = TTLCache(10000, 2 * SSE_RELAY_WINDOW.total_seconds())
+        self.published = 0
+        self.relayed = 0
+        self.dropped_connections = 0
+    
+    def can_subscribe(self, user_id: str) -> bool:
+        return len(self._subscribers.get(user_id, ())) < SSE_MAX_CONNECTIONS_PER_USER
+    
+    def subscribe(self, user_id: str) -> Optional[NotificationSubscriber]:
+        if not self.can_subscribe(user_id):
+            return None
+        subscribers = self._subscribers.setdefault(user_id, set())
+        subscriber = NotificationSubscriber(user_id)
+        subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: NotificationSubscriber):
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.user_id]
+    
+    def has_subscribers(self, user_id: str) -> bool:
+        return user_id in self._subscribers
+    
+    def subscribed_users(self) -> list:
+        return list(self._subscribers)
+    
+    def publish(self, user_id: str, event: str):
+        for subscriber in self._subscribers.get(user_id, ()):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up: end the stream, the client resumes on reconnect
+                subscriber.overflowed = True
+                self.dropped_connections += 1
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+        self.published += 1
+    
+    async def publish_unread_count(self, user_id: str):
+        if not self.has_subscribers(user_id):
+            return
+        unread = await get_unread_count(user_id)
+        self.publish(user_id, format_sse("unread_count", {"unread": unread}))
+    
+    async def publish_notifications(self, notifications: list):
+        """
+        Push newly created notifications, and the new unread counts, to connected
+        users; returns how many were pushed
+        """
+        user_ids = set()
+        pushed = 0
+        for notification in notifications:
+            # Only ids of streaming users are remembered, so a large fan-out to
+            # everyone else can't push them out and get them relayed twice
+            if not self.has_subscribers(notification["user_id"]) or self._recent.get(notification["id"]):
+                continue
+            self._recent.set(notification["id"], True)
+            self.publish(notification["user_id"], notification_event(notification))
+            user_ids.add(notification["user_id"])
+            pushed += 1
+        for user_id in user_ids:
+            await self.publish_unread_count(user_id)
+        return pushed
+    
+    def metrics(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "connections": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "relayed": self.relayed,
+            "dropped_connections": self.dropped_connections
+        }
+
+notification_broker = NotificationBroker()
+
+async def relay_notifications():
+    """Push recent notifications of users streaming from this worker that it hasn't pushed yet"""
+    user_ids = notification_broker.subscribed_users()
+    if not user_ids:
+        return
+    since = datetime.now(timezone.utc) - SSE_RELAY_WINDOW
+    notifications = await db.notifications.find(
+        {"user_id": {"$in": user_ids}, "created_at": {"$gt": since.isoformat()}},
+        {"_id": 0}
+    ).sort([("created_at", 1), ("id", 1)]).to_list(None)
+    notification_broker.relayed += await notification_broker.publish_notifications(notifications)
+
+notification_relay_job = PeriodicJob("notification_relay", SSE_RELAY_SECONDS, relay_notifications)
+
+# ============= NOTIFICATION ENGINE =============
+# AirstampScheduler fires fan-out for each episode at its airstamp. A slower
+# sweep scans the catalog (by its airstamp_at index) for anything that aired
+# since the previous sweep's watermark, covering downtime and episodes the
+# in-memory schedule never saw. Each follower gets one notification per
+# episode: the unique (user_id, episode_id) index makes repeats harmless, and
+# notified_at on the catalog episode keeps the sweep from even trying again
+# after the scheduler has fanned an episode out.
+
+NOTIFICATION_SWEEP_SECONDS = float(os.environ.get("NOTIFICATION_SWEEP_SECONDS", "900"))
+# After downtime, episodes that aired longer ago than this are not announced
+NOTIFICATION_MAX_CATCHUP = timedelta(hours=int(os.environ.get("NOTIFICATION_MAX_CATCHUP_HOURS", "6")))
+NOTIFICATION_BATCH_SIZE = 1000
+
+def build_episode_notification(episode: dict, show: dict) -> dict:
+    notification = Notification(
+        user_id=show["user_id"],
+        show_id=show["id"],
+        episode_id=episode["id"],
+        show_name=show["name"],
+        episode_name=episode["name"],
+        season=episode["season"],
+        episode_number=episode["number"],
+        airdate=episode.get("airdate") or "",
+        message=f"New episode of {show['name']}: S{episode['season']:02d}E{episode['number']:02d} - {episode['name']}"
+    )
+    notification_dict = notification.model_dump()
+    notification_dict["created_at"] = notification_dict["created_at"].isoformat()
+    return notification_dict
+
+async def insert_notifications(notifications: list) -> list:
+    """Insert notifications, skipping ones that already exist; returns the inserted documents"""
+    if not notifications:
+        return []
+    try:
+        await db.notifications.insert_many(notifications, ordered=False)
+        inserted = notifications
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        unexpected = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if unexpected:
+            logging.error(f"Failed to insert {len(unexpected)} notifications: {unexpected[0].get('errmsg')}")
+        inserted = [doc for i, doc in enumerate(notifications) if i not in failed]
+    for doc in inserted:
+        doc.pop("_id", None)
+    await increment_unread_counts(inserted)
+    await notification_broker.publish_notifications(inserted)
+    return inserted
+
+async def fan_out_episode_notifications(episode: dict) -> int:
+    """Notify every follower of the episode's show; returns how many notifications were created"""
+    created = 0
+    batch = []
+    cursor = db.shows.find(
+        {"tvmaze_id": episode["tvmaze_show_id"]},
+        {"_id": 0, "id": 1, "user_id": 1, "name": 1}
+    ).batch_size(NOTIFICATION_BATCH_SIZE)
+    async for show in cursor:
+        batch.append(build_episode_notification(episode, show))
+        if len(batch) >= NOTIFICATION_BATCH_SIZE:
+            created += len(await insert_notifications(batch))
+            batch = []
+    created += len(await insert_notifications(batch))
+    await db.episode_catalog.update_one(
+        {"id": episode["id"]},
+        {"$set": {"notified_at": datetime.now(timezone.utc)}}
+    )
+    return created
+
+async def generate_air_notifications():
+    """Create any missing notifications for episodes aired since the last sweep"""
+    now = datetime.now(timezone.utc)
+    window_end = now
+    
+    state = await db.scheduler_state.find_one({"id": "air_notifications"}, {"_id": 0})
+    window_start = now - NOTIFICATION_MAX_CATCHUP
+    if state and state.get("notified_until"):
+        window_start = max(window_start, datetime.fromisoformat(state["notified_until"]))
+    
+    created = 0
+    cursor = db.episode_catalog.find(
+        {"airstamp_at": {"$gt": window_start, "$lte": window_end}, "notified_at": {"$exists": False}},
+        {"_id": 0, "summary": 0}
+    )
+    async for episode in cursor:
+        created += await fan_out_episode_notifications(episode)
+    
+    await db.scheduler_state.update_one(
+        {"id": "air_notifications"},
+        {"$set": {"notified_until": window_end.isoformat()}},
+        upsert=True
+    )
+    if created:
+        logging.info(f"Created {created} episode notifications")
+
+air_notification_job = PeriodicJob("air_notifications", NOTIFICATION_SWEEP_SECONDS, generate_air_notifications)
+
+AIRSTAMP_HORIZON = timedelta(days=int(os.environ.get("AIRSTAMP_HORIZON_DAYS", "7")))
+# How often the schedule is re-read from the catalog, which also bounds how
+# late an airstamp change made by a non-leader worker is picked up
+AIRSTAMP_ROLL_INTERVAL = timedelta(minutes=5)
+
+class AirstampScheduler:
+    """
+    Min-heap of catalog episode airstamps within a rolling horizon. When an
+    airstamp comes due the episode's notifications are fanned out, so they
+    arrive seconds after airtime without polling the database. Rescheduled
+    episodes leave stale heap entries that are skipped when popped.
+    
+    Only the leader runs the scheduler, so schedule() calls made by other
+    workers' syncs are lost; each roll therefore re-reads the whole window
+    from the catalog instead of just the newly covered part.
+    """
+    
+    def __init__(self, horizon: timedelta, roll_interval: timedelta):
+        self.horizon = horizon
+        self.roll_interval = roll_interval
+        self._heap: list = []
+        self._scheduled: dict = {}
+        self._horizon_end: Optional[datetime] = None
+        self._next_roll: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+        self.failures = 0
+    
+    async def start(self):
+        now = datetime.now(timezone.utc)
+        self._horizon_end = now
+        await self._extend_horizon(now)
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._heap = []
+        self._scheduled = {}
+        self._horizon_end = None
+    
+    def schedule(self, episode_id: str, airstamp_at: Optional[datetime]):
+        """Add, move or drop an episode's firing time after its airstamp changed"""
+        if self._horizon_end is None:
+            return
+        airstamp_at = as_utc(airstamp_at)
+        if airstamp_at is None or not datetime.now(timezone.utc) < airstamp_at <= self._horizon_end:
+            self._scheduled.pop(episode_id, None)
+            return
+        if self._scheduled.get(episode_id) == airstamp_at:
+            return
+        self._scheduled[episode_id] = airstamp_at
+        heapq.heappush(self._heap, (airstamp_at, episode_id))
+        if len(self._heap) > 2 * len(self._scheduled) + 100:
+            # Too many stale entries; rebuild from the live schedule
+            self._heap = [(at, ep_id) for ep_id, at in self._scheduled.items()]
+            heapq.heapify(self._heap)
+        if self._heap[0] == (airstamp_at, episode_id):
+            self._wakeup.set()
+    
+    async def _extend_horizon(self, now: datetime):
+        new_end = now + self.horizon
+        cursor = db.episode_catalog.find(
+            {"airstamp_at": {"$gt": now, "$lte": new_end}},
+            {"_id": 0, "id": 1, "airstamp_at": 1}
+        )
+        scheduled = {}
+        async for episode in cursor:
+            scheduled[episode["id"]] = as_utc(episode["airstamp_at"])
+        # Replace rather than merge, so episodes moved or removed elsewhere drop out
+        self._scheduled = scheduled
+        self._heap = [(at, episode_id) for episode_id, at in scheduled.items()]
+        heapq.heapify(self._heap)
+        self._horizon_end = new_end
+        self._next_roll = now + self.roll_interval
+    
+    async def _fire(self, episode_id: str):
+        try:
+            episode = await db.episode_catalog.find_one({"id": episode_id}, {"_id": 0, "summary": 0})
+            # Already announced if the sweep got to it first
+            if episode and not episode.get("notified_at"):
+                created = await fan_out_episode_notifications(episode)
+                logging.info(f"Episode {episode_id} aired; created {created} notifications")
+            self.fired += 1
+        except Exception as e:
+            # The sweep job picks it up later
+            self.failures += 1
+            logging.error(f"Failed to fan out notifications for episode {episode_id}: {e}")
+    
+    async def _run(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            if now >= self._next_roll:
+                try:
+                    await self._extend_horizon(now)
+                except Exception as e:
+                    logging.error(f"Failed to roll airstamp horizon: {e}")
+                    self._next_roll = now + self.roll_interval
+            
+            while self._heap and self._heap[0][0] <= now:
+                airstamp_at, episode_id = heapq.heappop(self._heap)
+                if self._scheduled.get(episode_id) != airstamp_at:
+                    continue
+                del self._scheduled[episode_id]
+                await self._fire(episode_id)
+            
+            wake_at = self._next_roll
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, (wake_at - now).total_seconds()))
+            except asyncio.TimeoutError:
+                pass
+    
+    def metrics(self) -> dict:
+        return {
+            "scheduled": len(self._scheduled),
+            "heap_size": len(self._heap),
+            "next_airstamp": self._heap[0][0].isoformat() if self._heap else None,
+            "horizon_end": self._horizon_end.isoformat() if self._horizon_end else None,
+            "fired": self.fired,
+            "failures": self.failures
+        }
+
+airstamp_scheduler = AirstampScheduler(AIRSTAMP_HORIZON, AIRSTAMP_ROLL_INTERVAL)
 
 # ============= NOTIFICATION ROUTES =============
 
-@api_router.get("/notifications")
-async def get_notifications(user: User = Depends(get_current_user)):
-    """Get user notifications"""
+async def get_unread_count(user_id: str) -> int:
+    """Unread notifications for the user, from the counter maintained alongside writes"""
+    counter = await db.notification_counters.find_one({"user_id": user_id}, {"_id": 0, "unread": 1})
+    if counter is None:
+        # Counters are only created by seed_unread_counters() and the $inc on insert,
+        # so a user without one has no notifications yet, or the seed hasn't run
+        return await db.notifications.count_documents({"user_id": user_id, "read": False})
+    return counter["unread"]
+
+async def increment_unread_counts(notifications: list):
+    """Count new notifications; a missing counter starts from zero (see seed_unread_counters)"""
+    counts = {}
+    for notification in notifications:
+        counts[notification["user_id"]] = counts.get(notification["user_id"], 0) + 1
+    if counts:
+        await db.notification_counters.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$inc": {"unread": count}}, upsert=True)
+            for user_id, count in counts.items()
+        ], ordered=False)
+
+async def decrement_unread_count(user_id: str, count: int):
+    if count:
+        await db.notification_counters.update_one({"user_id": user_id}, {"$inc": {"unread": -count}})
+
+@api_router.get("/notifications", response_model=List[Notification])
+async def get_notifications(
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    unread_only: bool = False,
+    user: User = Depends(get_current_user)
+):
+    """
+    Get user notifications, newest first. `since` returns only notifications
+    created after that time; when more remain, the X-Next-Cursor response
+    header holds the cursor for the next page.
+    """
+    query = {"user_id": user.id}
+    if unread_only:
+        query["read"] = False
+    if since is not None:
+        # created_at is stored as a UTC ISO string, so compare in the same form
+        query["created_at"] = {"$gt": as_utc(since).astimezone(timezone.utc).isoformat()}
+    if cursor:
+        before_created_at, before_id = decode_cursor(cursor, 2)
+        query["$or"] = [
+            {"created_at": {"$lt": before_created_at}},
+            {"created_at": before_created_at, "id": {"$lt": before_id}}
+        ]
+    
     notifications = await db.notifications.find(
-        {"user_id": user.id},
+        query,
         {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    ).sort([("created_at", -1), ("id", -1)]).to_list(limit + 1)
     
-    for notif in notifications:
-        if isinstance(notif.get("created_at"), str):
-            notif["created_at"] = datetime.fromisoformat(notif["created_at"])
-            # Ensure timezone-aware
-            if notif["created_at"].tzinfo is None:
-                notif["created_at"] = notif["created_at"].replace(tzinfo=timezone.utc)
+    headers = {}
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(notifications[-1]["created_at"], notifications[-1]["id"])
     
-    return notifications
+    return MongoJSONResponse(notifications, headers=headers)
+
+@api_router.get("/notifications/unread-count")
+async def get_notifications_unread_count(user: User = Depends(get_current_user)):
+    """Get the number of unread notifications"""
+    return {"unread": await get_unread_count(user.id)}
 
 @api_router.put("/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str, user: User = Depends(get_current_user)):
     """Mark notification as read"""
     result = await db.notifications.update_one(
-        {"id": notification_id, "user_id": user.id},
+        {"id": notification_id, "user_id": user.id, "read": False},
         {"$set": {"read": True}}
     )
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Notification not found")
+    if result.modified_count == 0:
+        if not await db.notifications.find_one({"id": notification_id, "user_id": user.id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Notification not found")
+        return {"message": "Notification marked as read"}
     
+    await decrement_unread_count(user.id, 1)
+    await notification_broker.publish_unread_count(user.id)
     return {"message": "Notification marked as read"}
 
 @api_router.put("/notifications/read-all")
 async def mark_all_notifications_read(user: User = Depends(get_current_user)):
     """Mark all notifications as read"""
-    await db.notifications.update_many(
-        {"user_id": user.id},
+    result = await db.notifications.update_many(
+        {"user_id": user.id, "read": False},
         {"$set": {"read": True}}
     )
     
+    await decrement_unread_count(user.id, result.modified_count)
+    await notification_broker.publish_unread_count(user.id)
     return {"message": "All notifications marked as read"}
 
+@api_router.get("/notifications/stream")
+async def stream_notifications(request: Request, user: User = Depends(get_current_user)):
+    """
+    Server-Sent Events stream of new notifications and unread-count changes.
+    Reconnecting clients send Last-Event-ID to receive what they missed.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id")
+    resume_after = decode_cursor(last_event_id, 2) if last_event_id else None
+    
+    if not notification_broker.can_subscribe(user.id):
+        raise HTTPException(status_code=429, detail="Too many notification streams")
+    
+    async def events():
+        # Subscribed here rather than in the handler, so a response that is
+        # never iterated (client gone before the body starts) can't leak it
+        subscriber = notification_broker.subscribe(user.id)
+        if subscriber is None:
+            # Another stream took the last slot since the check above
+            return
+        try:
+            yield f"retry: {int(SSE_HEARTBEAT_SECONDS * 1000)}\n\n"
+            if resume_after:
+                # Subscribed first, so nothing is lost between replay and live events;
+                # a replayed notification may also arrive live, clients dedupe by id
+                created_at, notification_id = resume_after
+                missed = await db.notifications.find(
+                    {
+                        "user_id": user.id,
+                        "$or": [
+                            {"created_at": {"$gt": created_at}},
+                            {"created_at": created_at, "id": {"$gt": notification_id}}
+                        ]
+                    },
+                    {"_id": 0}
+                ).sort([("created_at", 1), ("id", 1)]).to_list(SSE_RESUME_LIMIT)
+                for notification in missed:
+                    yield notification_event(notification)
+            yield format_sse("unread_count", {"unread": await get_unread_count(user.id)})
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    break
+                yield event
+        finally:
+            notification_broker.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============= STARTUP PROFILE =============
+# Cold-start timings, in seconds since this module started importing: imports,
+# module body, each lifespan step, the first response and the deferred startup
+# work. Reported under "startup" in /api/metrics; STARTUP_PROFILE=1 also logs
+# them once the first request has been served and again when startup settles.
+
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE") == "1"
+
+class StartupProfile:
+    def __init__(self, started: float):
+        self.started = started
+        self.phases: dict = {}
+        self.first_request_served = False
+    
+    def mark(self, phase: str):
+        self.phases[phase] = round(time.perf_counter() - self.started, 4)
+    
+    def first_response(self):
+        self.first_request_served = True
+        self.mark("first_request_served")
+        if STARTUP_PROFILE:
+            self.log()
+    
+    def log(self):
+        previous = 0.0
+        lines = []
+        for phase, at in self.phases.items():
+            lines.append(f"  {phase:<24} {at * 1000:8.1f} ms  (+{(at - previous) * 1000:.1f} ms)")
+            previous = at
+        logging.info("Startup profile:\n" + "\n".join(lines))
+    
+    def metrics(self) -> dict:
+        return dict(self.phases)
+
+startup_profile = StartupProfile(IMPORT_STARTED)
+startup_profile.phases["imports"] = round(IMPORTS_DONE - IMPORT_STARTED, 4)
+
+class FirstRequestTimer:
+    """ASGI middleware that records when the first HTTP response has been sent"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if scope["type"] == "http" and not startup_profile.first_request_served:
+            startup_profile.first_response()
+
+def import_crypto_modules():
+    """Import the JWT/crypto stack so the first Apple sign-in doesn't pay for it in the request"""
+    import jwt  # noqa: F401
+    import jwt.algorithms  # noqa: F401 - loads cryptography's OpenSSL bindings
+    from jose import jwk  # noqa: F401
+    from jose.exceptions import JWTError  # noqa: F401
+
+# ============= METRICS =============
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """Internal runtime metrics; requires X-Metrics-Token, and doesn't exist unless METRICS_TOKEN is set"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("X-Metrics-Token", ""), METRICS_TOKEN):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    return {
+        "http": http_pool.metrics(),
+        "apple_jwks": apple_jwks_cache.metrics(),
+        "apple_client_secret": apple_client_secret.metrics(),
+        "session_cache": session_cache.metrics(),
+        "search_cache": search_cache.metrics(),
+        "tvmaze_limiter": tvmaze_limiter.metrics(),
+        "jobs": {
+            episode_refresh_job.name: episode_refresh_job.metrics(),
+            air_notification_job.name: air_notification_job.metrics(),
+            notification_relay_job.name: notification_relay_job.metrics(),
+            account_purge_job.name: account_purge_job.metrics(),
+            pending_sync_job.name: pending_sync_job.metrics()
+        },
+        "episode_sync_queue": episode_sync_queue.metrics(),
+        "leader_lease": background_jobs_lease.metrics(),
+        "airstamp_scheduler": airstamp_scheduler.metrics(),
+        "notification_stream": notification_broker.metrics(),
+        "shared_state": shared_state.metrics(),
+        "account_purges": account_purger.metrics(),
+        "startup": startup_profile.metrics()
+    }
+
+# ============= DATABASE INDEXES =============
+
+# Every query shape the app relies on, declared here instead of by hand in Atlas
+DATABASE_INDEXES = {
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("apple_id", ASCENDING)], unique=True, sparse=True),
+        IndexModel([("email", ASCENDING)]),
+    ],
+    "shows": [
+        IndexModel([("user_id", ASCENDING), ("tvmaze_id", ASCENDING)]),
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("tvmaze_id", ASCENDING)]),
+    ],
+    "episode_catalog": [
+        IndexModel([("tvmaze_episode_id", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("tvmaze_show_id", ASCENDING), ("season", ASCENDING), ("number", ASCENDING)]),
+        IndexModel([("tvmaze_show_id", ASCENDING), ("airdate", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("airstamp_at", ASCENDING)]),
+    ],
+    "watched_episodes": [
+        IndexModel([("user_id", ASCENDING), ("episode_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("show_id", ASCENDING)]),
+    ],
+    "show_catalog": [
+        IndexModel([("tvmaze_id", ASCENDING)], unique=True),
+        IndexModel([("episodes_status", ASCENDING)]),
+    ],
+    "notifications": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)]),
+        # One notification per user per episode; older notifications have no episode_id
+        IndexModel(
+            [("user_id", ASCENDING), ("episode_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"episode_id": {"$type": "string"}}
+        ),
+    ],
+    "show_progress": [
+        IndexModel([("user_id", ASCENDING), ("show_id", ASCENDING)], unique=True),
+        IndexModel([("tvmaze_id", ASCENDING)]),
+    ],
+    "notification_counters": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "migrations": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "scheduler_state": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "account_purges": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+        # Drop finished purge records once nobody will ask about them
+        IndexModel([("completed_at", ASCENDING)], expireAfterSeconds=ACCOUNT_PURGE_RETENTION_SECONDS),
+    ],
+}
+
+async def ensure_indexes():
+    """Create missing indexes; a failure on one collection doesn't block the others"""
+    async def create(collection: str, indexes: list):
+        try:
+            await db[collection].create_indexes(indexes)
+        except Exception as e:
+            logging.error(f"Failed to create indexes on {collection}: {e}")
+    
+    # One round trip per collection, so run them side by side
+    await asyncio.gather(*(create(collection, indexes) for collection, indexes in DATABASE_INDEXES.items()))
+
+# ============= WORKER LIFECYCLE =============
+# Each worker process (uvicorn --workers, gunicorn with uvicorn workers, or
+# several replicas) runs the lifespan below and opens its own Mongo client,
+# HTTP pool, sync queue and stream relay; nothing is connected at import time,
+# so forking after import is safe. Jobs that must run once per deployment run
+# only in the worker holding the "background_jobs" lease.
+
+LEADER_LEASE_SECONDS = float(os.environ.get("LEADER_LEASE_SECONDS", "30"))
+
+pending_sync_job = PeriodicJob("pending_syncs", EPISODE_SYNC_RESUME_INTERVAL_SECONDS, resume_pending_syncs)
+account_purge_job = PeriodicJob("account_purges", ACCOUNT_PURGE_RESUME_INTERVAL_SECONDS, resume_account_purges)
+
+async def run_migrations():
+    """One-off data migrations. Run by the leader only, in the background, since
+    the first run on a large database scans whole collections."""
+    try:
+        await migrate_legacy_episodes()
+    except Exception as e:
+        logger.error(f"Legacy episode migration failed: {e}")
+    try:
+        await backfill_episode_airstamps()
+    except Exception as e:
+        logger.error(f"Episode airstamp backfill failed: {e}")
+    try:
+        await convert_watched_at_to_dates()
+    except Exception as e:
+        logger.error(f"watched_at date conversion failed: {e}")
+    try:
+        await seed_unread_counters()
+    except Exception as e:
+        logger.error(f"Unread counter seeding failed: {e}")
+
+leader_startup: Optional[asyncio.Task] = None
+
+async def run_leader_jobs():
+    # Migrations first: syncs need the catalog migration and notifications the seeded counters
+    await run_migrations()
+    startup_profile.mark("migrations_checked")
+    episode_refresh_job.start()
+    air_notification_job.start()
+    try:
+        await airstamp_scheduler.start()
+    except Exception as e:
+        logger.error(f"Failed to start airstamp scheduler: {e}")
+    pending_sync_job.start()
+    account_purge_job.start()
+
+async def start_leader_jobs():
+    global leader_startup
+    # In a task, because the lease isn't renewed until on_elected returns
+    leader_startup = asyncio.create_task(run_leader_jobs())
+
+async def stop_leader_jobs():
+    if leader_startup is not None:
+        leader_startup.cancel()
+        await asyncio.gather(leader_startup, return_exceptions=True)
+    await airstamp_scheduler.stop()
+    await episode_refresh_job.stop()
+    await air_notification_job.stop()
+    await account_purge_job.stop()
+    await pending_sync_job.stop()
+
+background_jobs_lease = LeaderLease("background_jobs", LEADER_LEASE_SECONDS, start_leader_jobs, stop_leader_jobs)
+
+async def deferred_startup():
+    """Startup work that requests don't need, run once the worker is serving"""
+    try:
+        await asyncio.to_thread(import_crypto_modules)
+    except Exception as e:
+        logger.error(f"Failed to import JWT/crypto modules: {e}")
+    # Sign the Apple client secret now rather than during a login
+    try:
+        await asyncio.to_thread(generate_apple_client_secret)
+    except Exception as e:
+        logger.error(f"Failed to pre-sign Apple client secret: {e}")
+    startup_profile.mark("crypto_warmed")
+    await ensure_indexes()
+    startup_profile.mark("indexes_ensured")
+    # Leader jobs compete with the first requests for the event loop, so they go last
+    background_jobs_lease.start()
+    startup_profile.mark("background_jobs_started")
+    if STARTUP_PROFILE:
+        startup_profile.log()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_profile.mark("lifespan_started")
+    connect_db()
+    http_pool.start()
+    episode_sync_queue.start()
+    notification_relay_job.start()
+    deferred = asyncio.create_task(deferred_startup())
+    startup_profile.mark("ready")
+    try:
+        yield
+    finally:
+        deferred.cancel()
+        await asyncio.gather(deferred, return_exceptions=True)
+        await background_jobs_lease.stop()
+        await account_purger.stop()
+        await notification_relay_job.stop()
+        await episode_sync_queue.stop()
+        client.close()
+        await http_pool.aclose()
+        await shared_state.aclose()
+
+app = FastAPI(default_response_class=MongoJSONResponse, lifespan=lifespan)
+
 # Include router
 app.include_router(api_router)
 
@@ -992,7 +3861,9 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(FirstRequestTimer)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -1000,6 +3871,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+startup_profile.mark("module_loaded")
+
+if __name__ == "__main__":
+    import uvicorn
+    # WEB_CONCURRENCY worker processes; the same as `uvicorn server:app --workers N`
+    # or `gunicorn server:app -k uvicorn.workers.UvicornWorker -w N`
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    uvicorn.run(
+        # A single worker serves this already-imported app rather than importing it again
+        app if workers == 1 else "server:app",
+        app_dir=str(ROOT_DIR),
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8001")),
+        workers=workers
+    )
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the read-heavy API endpoints.
+
+Runs against a live backend with an existing session token, e.g.
+    python backend_benchmark.py --base-url http://localhost:8001 --token <session_token>
+and prints p50/p95/mean per endpoint plus the response size, so numbers can
+be compared before and after a change.
+
+With --scale it becomes a throughput load test instead: for each worker count
+it starts backend/server.py with WEB_CONCURRENCY set to that count, drives
+GET /api/episodes/upcoming from several client processes for --duration
+seconds, and reports requests per second and the speedup over one worker:
+    python backend_benchmark.py --token <session_token> --scale 1,2,4
+Run it on a machine with more cores than the largest worker count, since the
+load generator needs CPU of its own.
+
+With --startup it measures cold start: the import-time breakdown of server.py
+(python -X importtime) and, over several runs, the time from launching
+backend/server.py to its first response, plus the server's own startup phases:
+    python backend_benchmark.py --startup
+"""
+
+import argparse
+import os
+import re
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from threading import Thread
+
+import requests
+
+SERVER_PATH = Path(__file__).parent / "backend" / "server.py"
+
+class APIBenchmark:
+    def __init__(self, base_url, token, requests_per_endpoint=50):
+        self.api_url = f"{base_url.rstrip('/')}/api"
+        self.requests_per_endpoint = requests_per_endpoint
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.results = []
+
+    def time_endpoint(self, name, path, params=None):
+        """Request an endpoint repeatedly and record latency percentiles"""
+        url = f"{self.api_url}{path}"
+        # Warm up connections and server-side caches
+        response = self.session.get(url, params=params)
+        if response.status_code != 200:
+            print(f"❌ {name} - HTTP {response.status_code}: {response.text[:200]}")
+            return None
+
+        timings = []
+        for _ in range(self.requests_per_endpoint):
+            start = time.perf_counter()
+            response = self.session.get(url, params=params)
+            response.content
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        result = {
+            "endpoint": name,
+            "p50_ms": statistics.median(timings),
+            "p95_ms": timings[int(len(timings) * 0.95) - 1],
+            "mean_ms": statistics.mean(timings),
+            "bytes": len(response.content)
+        }
+        self.results.append(result)
+        print(f"⏱  {name:<32} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"mean {result['mean_ms']:8.2f} ms  {result['bytes']} bytes")
+        return result
+
+    def run(self):
+        print(f"\n📊 {self.requests_per_endpoint} requests per endpoint against {self.api_url}\n")
+        self.time_endpoint("auth/me", "/auth/me")
+        self.time_endpoint("shows/favorites", "/shows/favorites")
+        self.time_endpoint("shows/favorites (ndjson)", "/shows/favorites", {"stream": "ndjson"})
+
+        favorites = self.session.get(f"{self.api_url}/shows/favorites").json()
+        if favorites:
+            # The show with the most episodes is the interesting case
+            show = max(favorites, key=lambda s: s.get("progress", {}).get("total_count", 0))
+            path = f"/shows/{show['id']}/episodes"
+            self.time_endpoint("shows/{id}/episodes", path)
+            self.time_endpoint("shows/{id}/episodes (compact)", path, {"compact": "true"})
+            self.time_endpoint("shows/{id}/episodes (ndjson)", path, {"stream": "ndjson"})
+
+        self.time_endpoint("episodes/upcoming", "/episodes/upcoming")
+        self.time_endpoint("notifications", "/notifications")
+        return len(self.results) > 0
+
+def hammer(url, token, duration, threads):
+    """Request url from `threads` threads until the deadline; runs in a client process"""
+    counts = []
+
+    def loop():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        done = errors = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            try:
+                response = session.get(url)
+                if response.status_code == 200:
+                    done += 1
+                else:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+        counts.append((done, errors))
+
+    workers = [Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(done for done, _ in counts), sum(errors for _, errors in counts)
+
+class ScalingLoadTest:
+    def __init__(self, token, path, port, clients, client_processes, duration):
+        self.token = token
+        self.path = path
+        self.port = port
+        self.clients = clients
+        self.client_processes = client_processes
+        self.duration = duration
+        self.results = []
+
+    def start_server(self, workers):
+        env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(self.port), HOST="127.0.0.1")
+        server = subprocess.Popen(
+            [sys.executable, str(SERVER_PATH)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        # Wait until every worker could be answering
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                requests.get(f"http://127.0.0.1:{self.port}/api/auth/me", timeout=1)
+                time.sleep(2)
+                return server
+            except requests.RequestException:
+                time.sleep(0.5)
+        server.terminate()
+        raise RuntimeError(f"Server with {workers} workers did not start")
+
+    def measure(self, workers):
+        server = self.start_server(workers)
+        try:
+            url = f"http://127.0.0.1:{self.port}/api{self.path}"
+            threads = max(1, self.clients // self.client_processes)
+            with ProcessPoolExecutor(self.client_processes) as pool:
+                futures = [
+                    pool.submit(hammer, url, self.token, self.duration, threads)
+                    for _ in range(self.client_processes)
+                ]
+                totals = [future.result() for future in futures]
+        finally:
+            server.terminate()
+            server.wait()
+
+        done = sum(count for count, _ in totals)
+        errors = sum(errors for _, errors in totals)
+        result = {"workers": workers, "rps": done / self.duration, "errors": errors}
+        self.results.append(result)
+        return result
+
+    def run(self, worker_counts):
+        print(f"\n📈 GET /api{self.path}: {self.clients} clients for {self.duration}s per worker count "
+              f"({os.cpu_count()} CPUs)\n")
+        for workers in worker_counts:
+            result = self.measure(workers)
+            baseline = self.results[0]["rps"] / self.results[0]["workers"]
+            speedup = result["rps"] / self.results[0]["rps"] if self.results[0]["rps"] else 0
+            efficiency = result["rps"] / (baseline * workers) if baseline else 0
+            print(f"⏱  {workers:>2} workers  {result['rps']:9.1f} req/s  speedup {speedup:5.2f}x  "
+                  f"efficiency {efficiency:6.1%}  errors {result['errors']}")
+        return all(result["rps"] > 0 for result in self.results)
+
+class StartupBenchmark:
+    def __init__(self, port, runs):
+        self.port = port
+        self.runs = runs
+
+    def import_breakdown(self, top=15):
+        """Cumulative import time of each module server.py imports directly"""
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import server"],
+            cwd=SERVER_PATH.parent,
+            capture_output=True,
+            text=True
+        )
+        # Children are listed before their parent, one indent level (2 spaces) deeper
+        imports = []
+        for line in result.stderr.splitlines():
+            match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+            if match:
+                imports.append((match.group(3), len(match.group(2)), int(match.group(1))))
+        server_at = next(i for i, (module, _, _) in enumerate(imports) if module == "server")
+        _, server_indent, total = imports[server_at]
+        direct = []
+        for module, indent, cumulative in reversed(imports[:server_at]):
+            if indent <= server_indent:
+                break
+            if indent == server_indent + 2:
+                direct.append((module, cumulative))
+        direct.sort(key=lambda item: item[1], reverse=True)
+
+        print(f"\n📦 Import time of server.py: {total / 1000:.1f} ms\n")
+        for module, cumulative in direct[:top]:
+            print(f"   {module:<32} {cumulative / 1000:8.1f} ms")
+        return total
+
+    def time_to_first_request(self):
+        """Seconds from launching the server to its first HTTP response, and its startup phases"""
+        metrics_token = secrets.token_hex(8)
+        env = dict(
+            os.environ,
+            WEB_CONCURRENCY="1",
+            PORT=str(self.port),
+            HOST="127.0.0.1",
+            METRICS_TOKEN=metrics_token
+        )
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, str(SERVER_PATH)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            deadline = started + 60
+            while time.perf_counter() < deadline:
+                try:
+                    # Any response, 401 included, means the app is serving
+                    requests.get(f"http://127.0.0.1:{self.port}/api/auth/me", timeout=1)
+                    break
+                except requests.RequestException:
+                    time.sleep(0.005)
+            else:
+                raise RuntimeError("Server did not start")
+            elapsed = time.perf_counter() - started
+            # Let the deferred startup work finish before reading the phases
+            time.sleep(1)
+            phases = requests.get(
+                f"http://127.0.0.1:{self.port}/api/metrics",
+                headers={"X-Metrics-Token": metrics_token}
+            ).json().get("startup", {})
+        finally:
+            server.terminate()
+            server.wait()
+        return elapsed, phases
+
+    def run(self):
+        self.import_breakdown()
+
+        timings = []
+        phases = {}
+        for _ in range(self.runs):
+            elapsed, phases = self.time_to_first_request()
+            timings.append(elapsed)
+
+        print(f"\n🚀 Launch to first response over {self.runs} runs: "
+              f"median {statistics.median(timings) * 1000:.1f} ms, best {min(timings) * 1000:.1f} ms\n")
+        print("   Server phases (last run, ms since server.py started importing):")
+        for phase, at in phases.items():
+            print(f"   {phase:<32} {at * 1000:8.1f} ms")
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--token", help="session token of a user with favorites")
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("--scale", help="comma-separated worker counts to load test, e.g. 1,2,4")
+    parser.add_argument("--path", default="/episodes/upcoming", help="endpoint to load test")
+    parser.add_argument("--port", type=int, default=8011, help="port for the servers started by --scale")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent connections during --scale")
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--startup", action="store_true", help="measure import time and time to first request")
+    parser.add_argument("--startup-runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.startup:
+        return 0 if StartupBenchmark(args.port, args.startup_runs).run() else 1
+    if not args.token:
+        parser.error("--token is required unless --startup is given")
+
+    if args.scale:
+        worker_counts = [int(count) for count in args.scale.split(",")]
+        load_test = ScalingLoadTest(
+            args.token, args.path, args.port, args.clients, args.client_processes, args.duration
+        )
+        return 0 if load_test.run(worker_counts) else 1
+
+    benchmark = APIBenchmark(args.base_url, args.token, args.requests)
+    return 0 if benchmark.run() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
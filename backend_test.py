@@ -92,7 +92,11 @@ class TVShowTrackerAPITester:
         db.user_sessions.deleteMany({session_token: /test_session/});
         db.shows.deleteMany({user_id: /test-user-/});
         db.episodes.deleteMany({user_id: /test-user-/});
+        db.watched_episodes.deleteMany({user_id: /test-user-/});
+        db.show_progress.deleteMany({user_id: /test-user-/});
         db.notifications.deleteMany({user_id: /test-user-/});
+        db.notification_counters.deleteMany({user_id: /test-user-/});
+        db.account_purges.deleteMany({user_id: /test-user-/});
         print('Cleanup complete');
         """
         
@@ -0,0 +1,24 @@
+"""
+Shared setup: makes backend/server.py importable without a live MongoDB and
+provides an in-memory database (mongomock_motor) for tests that need one.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import pytest
+
+import server
+
+@pytest.fixture
+def db(monkeypatch):
+    """Point server.db at a fresh in-memory database for the test"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test_database"]
+    monkeypatch.setattr(server, "db", database)
+    return database
@@ -0,0 +1,101 @@
+"""
+Tests for AppleJWKSCache in backend/server.py: max-age handling and serving
+cached keys while Apple's key endpoint is failing.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import server
+
+jose_jwk = pytest.importorskip("jose.jwk")
+rsa = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.rsa")
+serialization = pytest.importorskip("cryptography.hazmat.primitives.serialization")
+
+def apple_key(kid):
+    """A public JWK as Apple publishes it"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return {**jose_jwk.construct(pem, "RS256").to_dict(), "kid": kid, "use": "sig"}
+
+class FakeHTTPPool:
+    """Stands in for http_pool: answers with responses in order; exceptions are raised"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    async def get(self, url, **kwargs):
+        self.requests += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+def keys_response(*keys, max_age=0):
+    return httpx.Response(
+        200,
+        json={"keys": list(keys)},
+        headers={"Cache-Control": f"max-age={max_age}"},
+        request=httpx.Request("GET", server.APPLE_KEYS_URL)
+    )
+
+def test_expired_keys_are_served_while_refresh_fails(monkeypatch):
+    pool = FakeHTTPPool(keys_response(apple_key("k1")), httpx.ConnectError("Apple is down"))
+    monkeypatch.setattr(server, "http_pool", pool)
+    cache = server.AppleJWKSCache(server.APPLE_KEYS_URL)
+
+    async def main():
+        first = await cache.get_key("k1")
+        assert first.startswith("-----BEGIN PUBLIC KEY-----")
+        # max-age=0, so this refreshes, fails, and falls back to the cached key
+        assert await cache.get_key("k1") == first
+        # The failed refresh isn't retried on every sign-in
+        assert await cache.get_key("k1") == first
+
+    asyncio.run(main())
+    assert pool.requests == 2
+    assert cache.metrics()["refresh_failures"] == 1
+
+def test_concurrent_callers_share_one_failed_refresh(monkeypatch):
+    pool = FakeHTTPPool(keys_response(apple_key("k1")), httpx.ConnectError("Apple is down"))
+    monkeypatch.setattr(server, "http_pool", pool)
+    cache = server.AppleJWKSCache(server.APPLE_KEYS_URL)
+
+    async def main():
+        await cache.get_key("k1")
+        keys = await asyncio.gather(*(cache.get_key("k1") for _ in range(5)))
+        assert all(keys)
+
+    asyncio.run(main())
+    assert pool.requests == 2
+
+def test_refresh_failure_for_unknown_kid_propagates(monkeypatch):
+    pool = FakeHTTPPool(
+        keys_response(apple_key("k1"), max_age=3600),
+        httpx.Response(503, request=httpx.Request("GET", server.APPLE_KEYS_URL))
+    )
+    monkeypatch.setattr(server, "http_pool", pool)
+    cache = server.AppleJWKSCache(server.APPLE_KEYS_URL)
+    # Past the minimum interval between unknown-kid refreshes
+    monkeypatch.setattr(server, "APPLE_JWKS_MIN_REFRESH_SECONDS", 0)
+
+    async def main():
+        await cache.get_key("k1")
+        with pytest.raises(httpx.HTTPStatusError):
+            await cache.get_key("rotated")
+        # Known keys still work
+        assert await cache.get_key("k1")
+
+    asyncio.run(main())
+
+def test_first_fetch_failure_propagates(monkeypatch):
+    monkeypatch.setattr(server, "http_pool", FakeHTTPPool(httpx.ConnectError("Apple is down")))
+    cache = server.AppleJWKSCache(server.APPLE_KEYS_URL)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(cache.get_key("k1"))
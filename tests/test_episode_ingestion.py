@@ -0,0 +1,59 @@
+"""
+Tests for ingest_episodes in backend/server.py: the diff-apply of a TVMaze
+episode list to the catalog and the counts it reports.
+"""
+
+import asyncio
+
+import server
+
+def tvmaze_episode(episode_id, name=None, airstamp="2030-01-01T01:00:00+00:00"):
+    return {
+        "id": episode_id,
+        "season": 1,
+        "number": episode_id % 100,
+        "name": name or f"Episode {episode_id}",
+        "airdate": airstamp[:10],
+        "airstamp": airstamp,
+        "runtime": 30,
+        "summary": "<p>Summary</p>"
+    }
+
+def ingest(episodes):
+    return asyncio.run(server.ingest_episodes(1, episodes))
+
+def test_first_ingestion_inserts_every_episode(db):
+    report = ingest([tvmaze_episode(101), tvmaze_episode(102), tvmaze_episode(103)])
+    assert report == {"inserted": 3, "updated": 0, "skipped": 0, "failed": 0}
+    assert asyncio.run(db.episode_catalog.count_documents({"tvmaze_show_id": 1})) == 3
+
+def test_reingesting_the_same_list_skips_everything(db):
+    episodes = [tvmaze_episode(101), tvmaze_episode(102)]
+    ingest(episodes)
+    assert ingest(episodes) == {"inserted": 0, "updated": 0, "skipped": 2, "failed": 0}
+
+def test_reingestion_counts_new_changed_unchanged_and_invalid(db):
+    ingest([tvmaze_episode(101), tvmaze_episode(102), tvmaze_episode(103)])
+    report = ingest([
+        tvmaze_episode(101),
+        tvmaze_episode(102, name="Renamed"),
+        tvmaze_episode(103, airstamp="2030-02-01T01:00:00+00:00"),
+        tvmaze_episode(104),
+        # No season: rejected by validation
+        {"id": 105, "number": 5, "name": "Broken"}
+    ])
+    assert report == {"inserted": 1, "updated": 2, "skipped": 1, "failed": 1}
+
+    renamed = asyncio.run(db.episode_catalog.find_one({"tvmaze_episode_id": 102}))
+    assert renamed["name"] == "Renamed"
+    moved = asyncio.run(db.episode_catalog.find_one({"tvmaze_episode_id": 103}))
+    assert moved["airdate"] == "2030-02-01"
+    assert server.as_utc(moved["airstamp_at"]) == server.parse_airstamp("2030-02-01T01:00:00+00:00")
+
+def test_reingestion_keeps_fields_it_does_not_own(db):
+    ingest([tvmaze_episode(101)])
+    asyncio.run(db.episode_catalog.update_one({"tvmaze_episode_id": 101}, {"$set": {"notified_at": "x"}}))
+    ingest([tvmaze_episode(101, name="Renamed")])
+    episode = asyncio.run(db.episode_catalog.find_one({"tvmaze_episode_id": 101}))
+    assert episode["name"] == "Renamed"
+    assert episode["notified_at"] == "x"
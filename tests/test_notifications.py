@@ -0,0 +1,154 @@
+"""
+Tests for notification storage in backend/server.py: unread counters kept
+alongside inserts and reads, and the notification list query.
+"""
+
+import asyncio
+
+import server
+
+def make_episode(episode_id="e1", tvmaze_show_id=1):
+    return {
+        "id": episode_id,
+        "tvmaze_show_id": tvmaze_show_id,
+        "name": f"Episode {episode_id}",
+        "season": 1,
+        "number": 1,
+        "airdate": "2026-01-01"
+    }
+
+def make_notification(user_id, episode_id, read=False):
+    show = {"id": f"show-{user_id}", "user_id": user_id, "name": "Show"}
+    notification = server.build_episode_notification(make_episode(episode_id), show)
+    notification["read"] = read
+    return notification
+
+# ============= UNREAD COUNTERS =============
+
+def test_new_notifications_add_to_existing_unread_without_counter(db):
+    async def main():
+        # Unread notifications from before counters existed
+        await db.notifications.insert_many([make_notification("u1", f"old{i}") for i in range(5)])
+        await db.notifications.insert_one(make_notification("u1", "read", read=True))
+        await server.seed_unread_counters()
+
+        await server.insert_notifications([make_notification("u1", "new")])
+        assert await server.get_unread_count("u1") == 6
+        assert await db.notifications.count_documents({"user_id": "u1", "read": False}) == 6
+
+    asyncio.run(main())
+
+def test_first_notification_of_new_user_starts_counter_at_one(db):
+    async def main():
+        await server.seed_unread_counters()
+        assert await server.get_unread_count("u2") == 0
+        await server.insert_notifications([make_notification("u2", "e1"), make_notification("u2", "e2")])
+        assert await server.get_unread_count("u2") == 2
+        # A repeat of an existing notification is rejected by the index and not counted
+        await db.notifications.create_index(
+            [("user_id", 1), ("episode_id", 1)],
+            unique=True,
+            partialFilterExpression={"episode_id": {"$type": "string"}}
+        )
+        await server.insert_notifications([make_notification("u2", "e2")])
+        assert await server.get_unread_count("u2") == 2
+
+    asyncio.run(main())
+
+def test_unread_count_reads_without_creating_counter(db):
+    async def main():
+        await db.notifications.insert_many([make_notification("u3", f"e{i}") for i in range(3)])
+        assert await server.get_unread_count("u3") == 3
+        assert await db.notification_counters.count_documents({}) == 0
+
+    asyncio.run(main())
+
+def test_seed_keeps_counters_that_already_exist(db):
+    async def main():
+        await db.notifications.insert_many([make_notification("u4", f"e{i}") for i in range(2)])
+        await db.notification_counters.insert_one({"user_id": "u4", "unread": 7})
+        await server.seed_unread_counters()
+        assert await server.get_unread_count("u4") == 7
+        # Runs once
+        await db.notification_counters.delete_many({})
+        await server.seed_unread_counters()
+        assert await db.notification_counters.count_documents({}) == 0
+
+    asyncio.run(main())
+
+# ============= NOTIFICATION LIST =============
+
+def list_notifications(**params):
+    user = server.User(id="u1", email="u1@example.com", name="u1", picture="", created_at=server.datetime.now(server.timezone.utc))
+    params = {"limit": 100, "cursor": None, "since": None, "unread_only": False, **params}
+    response = asyncio.run(server.get_notifications(user=user, **params))
+    return server.orjson.loads(response.body)
+
+def test_since_with_utc_offset_is_converted_to_utc(db):
+    notification = make_notification("u1", "e1")
+    notification["created_at"] = "2026-03-01T12:00:00+00:00"
+    asyncio.run(db.notifications.insert_one(notification))
+
+    # 13:00+02:00 is 11:00Z, before the notification
+    since = server.datetime.fromisoformat("2026-03-01T13:00:00+02:00")
+    assert [n["id"] for n in list_notifications(since=since)] == [notification["id"]]
+    # 14:30+02:00 is 12:30Z, after it
+    since = server.datetime.fromisoformat("2026-03-01T14:30:00+02:00")
+    assert list_notifications(since=since) == []
+    # Naive values are taken as UTC
+    assert len(list_notifications(since=server.datetime(2026, 3, 1, 11, 59))) == 1
+
+# ============= AIR NOTIFICATIONS =============
+
+def test_sweep_skips_episodes_the_scheduler_already_announced(db, monkeypatch):
+    async def main():
+        aired = server.datetime.now(server.timezone.utc) - server.timedelta(minutes=5)
+        for episode_id in ("fired", "missed"):
+            await db.episode_catalog.insert_one({**make_episode(episode_id), "airstamp_at": aired})
+        await db.shows.insert_many([
+            {"id": f"s{i}", "user_id": f"u{i}", "tvmaze_id": 1, "name": "Show"} for i in range(3)
+        ])
+
+        await server.AirstampScheduler(server.timedelta(days=1), server.timedelta(minutes=5))._fire("fired")
+        assert await db.notifications.count_documents({"episode_id": "fired"}) == 3
+
+        attempted = []
+        insert_notifications = server.insert_notifications
+        async def record(notifications):
+            attempted.extend(notification["episode_id"] for notification in notifications)
+            return await insert_notifications(notifications)
+        monkeypatch.setattr(server, "insert_notifications", record)
+
+        await server.generate_air_notifications()
+        # Only the episode the scheduler never saw is fanned out
+        assert attempted == ["missed"] * 3
+        assert await db.episode_catalog.count_documents({"notified_at": {"$exists": True}}) == 2
+
+        attempted.clear()
+        await db.scheduler_state.delete_many({})
+        await server.generate_air_notifications()
+        assert attempted == []
+
+    asyncio.run(main())
+
+# ============= NOTIFICATION STREAM =============
+
+def test_large_fan_out_does_not_evict_ids_of_streaming_users(db, monkeypatch):
+    async def main():
+        broker = server.NotificationBroker()
+        monkeypatch.setattr(server, "notification_broker", broker)
+        subscriber = broker.subscribe("streaming")
+        mine = make_notification("streaming", "e1")
+        await broker.publish_notifications([mine])
+        # Far more notifications for users without streams than _recent holds
+        others = [make_notification(f"user{i}", "e1") for i in range(broker._recent.maxsize + 10)]
+        await broker.publish_notifications(others)
+
+        # The relay sees the streaming user's notification again and must not repeat it
+        assert await broker.publish_notifications([mine]) == 0
+        events = []
+        while not subscriber.queue.empty():
+            events.append(subscriber.queue.get_nowait())
+        assert sum(mine["id"] in event for event in events) == 1
+
+    asyncio.run(main())
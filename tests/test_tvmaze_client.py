@@ -0,0 +1,143 @@
+"""
+Tests for the TVMaze client in backend/server.py: the priority token bucket,
+429 handling in tvmaze_get, and the budget shared between workers.
+"""
+
+import asyncio
+import time
+
+import httpx
+
+import server
+from server import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, TokenBucketLimiter
+
+class FakeHTTPPool:
+    """Stands in for http_pool, answering GETs with canned responses in order"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def get(self, url, **kwargs):
+        self.requests.append(url)
+        return self.responses.pop(0)
+
+# ============= TOKEN BUCKET =============
+
+def test_waiters_are_granted_by_priority_then_arrival():
+    async def main():
+        # One token every 20 ms, and none left once the first call has it
+        limiter = TokenBucketLimiter(1, 0.02)
+        await limiter.acquire()
+        order = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(call("background 1", PRIORITY_BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("background 2", PRIORITY_BACKGROUND)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "background 1", "background 2"]
+
+    asyncio.run(main())
+
+def test_cancelled_waiter_does_not_use_a_token():
+    async def main():
+        limiter = TokenBucketLimiter(1, 0.05)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        started = time.monotonic()
+        await limiter.acquire()
+        # Granted with the next token, not the one after it
+        assert time.monotonic() - started < 0.09
+
+    asyncio.run(main())
+
+def test_pause_holds_every_lane():
+    async def main():
+        limiter = TokenBucketLimiter(100, 1)
+        limiter.pause(0.2)
+        started = time.monotonic()
+        await limiter.acquire(PRIORITY_INTERACTIVE)
+        assert time.monotonic() - started >= 0.19
+        assert limiter.metrics()["pauses"] == 1
+
+    asyncio.run(main())
+
+# ============= RATE-LIMITED GET =============
+
+def test_429_pauses_limiter_and_retries(monkeypatch):
+    pool = FakeHTTPPool(
+        httpx.Response(429, headers={"Retry-After": "0.2"}),
+        httpx.Response(200, json=[])
+    )
+    # pause() also drops saved tokens; a fast refill keeps the test short
+    limiter = TokenBucketLimiter(100, 1)
+    monkeypatch.setattr(server, "http_pool", pool)
+    monkeypatch.setattr(server, "tvmaze_limiter", limiter)
+
+    async def main():
+        started = time.monotonic()
+        response = await server.tvmaze_get("/shows/1/episodes")
+        assert response.status_code == 200
+        # The retry waited out Retry-After
+        assert time.monotonic() - started >= 0.19
+
+    asyncio.run(main())
+    assert len(pool.requests) == 2
+    assert limiter.metrics()["pauses"] == 1
+
+def test_429_is_returned_once_retries_run_out(monkeypatch):
+    pool = FakeHTTPPool(*(httpx.Response(429, headers={"Retry-After": "0"}) for _ in range(3)))
+    monkeypatch.setattr(server, "http_pool", pool)
+    monkeypatch.setattr(server, "tvmaze_limiter", TokenBucketLimiter(100, 1))
+    monkeypatch.setattr(server, "TVMAZE_MAX_429_RETRIES", 2)
+
+    response = asyncio.run(server.tvmaze_get("/shows/1"))
+    assert response.status_code == 429
+    assert len(pool.requests) == 3
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert server.retry_after_seconds(httpx.Response(429, headers={"Retry-After": "3"}), 1) == 3
+    assert server.retry_after_seconds(httpx.Response(429), 1) == 1
+    past = httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert server.retry_after_seconds(past, 1) == 0
+
+# ============= SHARED BUDGET =============
+
+def test_shared_budget_bounds_calls_across_limiters():
+    async def main():
+        store = server.InMemoryKVStore().namespace("tvmaze_rate")
+        # Each would allow a burst of 10; shared, two calls per 0.2 s window
+        workers = [TokenBucketLimiter(10, 1), TokenBucketLimiter(10, 1)]
+        for limiter in workers:
+            limiter.share(store, 0.2)
+        granted = []
+
+        async def call(limiter):
+            await limiter.acquire()
+            granted.append(time.monotonic())
+
+        started = time.monotonic()
+        tasks = [asyncio.create_task(call(limiter)) for limiter in workers for _ in range(3)]
+        await asyncio.sleep(0.1)
+        # At most one window boundary has passed
+        assert len(granted) <= 4
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=2)
+        # Six calls at two per window need at least two more windows
+        assert granted[-1] - started >= 0.2
+        assert sum(limiter.metrics()["shared_waits"] for limiter in workers) > 0
+
+    asyncio.run(main())
+
+def test_split_divides_the_limit_between_workers():
+    limiter = TokenBucketLimiter(20, 10)
+    limiter.split(4)
+    assert limiter.capacity == 5
+    assert limiter.rate == 0.5
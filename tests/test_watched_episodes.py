@@ -0,0 +1,99 @@
+"""
+Tests for PUT /api/episodes/watched (mark_episodes_watched in backend/server.py):
+marking by episode id, by season and up to an episode, and invalid combinations.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import BatchWatchedRequest, EpisodeNumber
+
+USER = server.User(
+    id="u1",
+    email="u1@example.com",
+    name="u1",
+    picture="",
+    created_at=server.datetime.now(server.timezone.utc)
+)
+
+def catalog_episode(tvmaze_show_id, season, number):
+    episode_id = str(tvmaze_show_id * 1000 + season * 100 + number)
+    return {"id": episode_id, "tvmaze_show_id": tvmaze_show_id, "season": season, "number": number}
+
+@pytest.fixture
+def library(db):
+    """The user follows show 1 (two seasons); show 2 is in the catalog but not followed"""
+    async def seed():
+        await db.shows.insert_one({"id": "s1", "user_id": USER.id, "tvmaze_id": 1, "name": "One"})
+        await db.episode_catalog.insert_many(
+            [catalog_episode(1, 1, number) for number in (1, 2, 3)]
+            + [catalog_episode(1, 2, number) for number in (1, 2)]
+            + [catalog_episode(2, 1, 1)]
+        )
+
+    asyncio.run(seed())
+    return db
+
+def mark(**fields):
+    return asyncio.run(server.mark_episodes_watched(BatchWatchedRequest(**fields), USER))
+
+def watched_ids(db):
+    return sorted(doc["episode_id"] for doc in asyncio.run(db.watched_episodes.find({"user_id": USER.id}).to_list(None)))
+
+def test_mark_by_episode_ids_reports_each_episode(library):
+    result = mark(episode_ids=["1101", "1101", "2101", "missing"])
+    assert [(r["episode_id"], r["status"]) for r in result["results"]] == [
+        ("1101", "updated"),
+        # Not followed by the user
+        ("2101", "not_found"),
+        ("missing", "not_found")
+    ]
+    assert watched_ids(library) == ["1101"]
+
+    result = mark(episode_ids=["1101"])
+    assert (result["updated"], result["unchanged"]) == (0, 1)
+    result = mark(episode_ids=["1101"], watched=False)
+    assert result["updated"] == 1
+    assert watched_ids(library) == []
+
+def test_mark_whole_season(library):
+    result = mark(show_id="s1", season=2)
+    assert (result["updated"], result["unchanged"], result["not_found"]) == (2, 0, 0)
+    assert watched_ids(library) == ["1201", "1202"]
+
+def test_mark_up_to_episode_includes_earlier_seasons(library):
+    mark(episode_ids=["1101"])
+    result = mark(show_id="s1", up_to={"season": 2, "number": 1})
+    assert [r["episode_id"] for r in result["results"]] == ["1101", "1102", "1103", "1201"]
+    assert (result["updated"], result["unchanged"]) == (3, 1)
+
+    result = mark(show_id="s1", up_to=EpisodeNumber(season=1, number=2), watched=False)
+    assert result["updated"] == 2
+    assert watched_ids(library) == ["1103", "1201"]
+
+def test_marking_marks_progress_stale(library):
+    asyncio.run(library.show_progress.insert_one({"user_id": USER.id, "show_id": "s1", "stale": False}))
+    mark(show_id="s1", season=1)
+    progress = asyncio.run(library.show_progress.find_one({"user_id": USER.id, "show_id": "s1"}))
+    assert progress["stale"] is True
+
+@pytest.mark.parametrize("fields", [
+    {"episode_ids": ["1101"], "season": 1},
+    {"episode_ids": ["1101"], "up_to": {"season": 1, "number": 2}},
+    {"episode_ids": ["1101"], "show_id": "s1"},
+    {"season": 1},
+    {}
+])
+def test_invalid_combinations_are_rejected(library, fields):
+    with pytest.raises(HTTPException) as error:
+        mark(**fields)
+    assert error.value.status_code == 400
+    assert watched_ids(library) == []
+
+def test_unknown_show_is_not_found(library):
+    with pytest.raises(HTTPException) as error:
+        mark(show_id="someone-elses", season=1)
+    assert error.value.status_code == 404